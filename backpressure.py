@@ -0,0 +1,185 @@
+from threading import Condition
+from typing import Callable, Dict
+
+from distributed_objects.channel import ChannelWrapper
+
+
+class OverflowPolicy:
+    # sender waits until there is room, only for executors with a thread per handler,
+    # on shared threads a waiting sender may hold the thread its receiver needs
+    block = "block"
+    # the oldest accepted message isn't delivered, the new one takes its place
+    drop_oldest = "drop_oldest"
+    # the new message is dropped
+    drop_newest = "drop_newest"
+    # the new message isn't accepted and the sender's _on_message_rejected_ is called
+    signal = "signal"
+
+
+overflow_policies = (OverflowPolicy.block, OverflowPolicy.drop_oldest, OverflowPolicy.drop_newest, OverflowPolicy.signal)
+
+
+class QueueSlot:
+    __slots__ = ("is_dropped", "task_info")
+
+    def __init__(self):
+        self.is_dropped = False
+        # scheduled delivery or handling of the message, descheduled when the message is dropped
+        self.task_info = None
+
+
+class BoundedQueue:
+    """
+    Occupancy limit of a mailbox or a channel. A slot is taken when a message is accepted and given back
+    when the message is handled or delivered, tasks of messages dropped by drop_oldest are descheduled,
+    so their handler doesn't keep them
+    """
+
+    def __init__(self, capacity, policy=OverflowPolicy.drop_newest):
+        if capacity <= 0:
+            raise ValueError(f"Capacity should be positive, got {capacity}")
+        if policy not in overflow_policies:
+            raise ValueError(f"Unknown overflow policy {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        self.condition = Condition()
+        # accepted messages in the order they came, dict keeps it and removes any slot in O(1)
+        self.slots: Dict[QueueSlot, None] = {}
+        self.max_occupancy = 0
+        self.dropped_count = 0
+        self.rejected_count = 0
+        self.is_closed = False
+        # called under the queue's lock for every dropped message
+        self.on_dropped: Callable[[], None] | None = None
+
+    def acquire(self) -> QueueSlot | None:
+        """
+        :return: slot of the new message, None if the message shouldn't be accepted
+        """
+        with self.condition:
+            slots = self.slots
+            while len(slots) >= self.capacity and not self.is_closed:
+                if self.policy == OverflowPolicy.block:
+                    self.condition.wait()
+                elif self.policy == OverflowPolicy.drop_oldest:
+                    oldest_slot = next(iter(slots))
+                    del slots[oldest_slot]
+                    oldest_slot.is_dropped = True
+                    if oldest_slot.task_info is not None:
+                        oldest_slot.task_info.deschedule_task()
+                        oldest_slot.task_info = None
+                    self.__on_dropped__()
+                elif self.policy == OverflowPolicy.drop_newest:
+                    self.__on_dropped__()
+                    return None
+                else:
+                    self.rejected_count += 1
+                    return None
+            if self.is_closed:
+                return None
+
+            slot = QueueSlot()
+            slots[slot] = None
+            if len(slots) > self.max_occupancy:
+                self.max_occupancy = len(slots)
+            return slot
+
+    def attach(self, slot: QueueSlot, task_info):
+        """
+        keeps the task scheduled for the message of the slot, it's descheduled right away if the message was dropped
+        """
+        if task_info is None:
+            return
+        with self.condition:
+            if not slot.is_dropped:
+                slot.task_info = task_info
+                return
+        task_info.deschedule_task()
+
+    def release(self, slot: QueueSlot) -> bool:
+        """
+        :return: False if the message was dropped and shouldn't be passed further
+        """
+        with self.condition:
+            if slot.is_dropped:
+                return False
+            self.slots.pop(slot, None)
+            slot.task_info = None
+            if self.policy == OverflowPolicy.block:
+                self.condition.notify()
+            return True
+
+    def close(self):
+        """
+        wakes up blocked senders, nothing is accepted afterwards
+        """
+        with self.condition:
+            self.is_closed = True
+            self.condition.notify_all()
+
+    def get_occupancy(self) -> int:
+        return len(self.slots)
+
+    def get_summary(self):
+        return {
+            "occupancy": self.get_occupancy(),
+            "capacity": self.capacity,
+            "policy": self.policy,
+            "max_occupancy": self.max_occupancy,
+            "dropped": self.dropped_count,
+            "rejected": self.rejected_count
+        }
+
+    def __on_dropped__(self):
+        self.dropped_count += 1
+        if self.on_dropped is not None:
+            self.on_dropped()
+
+
+class BoundedChannel(ChannelWrapper):
+    """
+    Put in the routing table instead of the channel when it has a capacity,
+    runs on the sender's thread, so block policy holds the sender until the channel delivers something
+    """
+
+    def __init__(self, channel, bounded_queue: BoundedQueue, on_rejected: Callable, sender_id, receiver_id):
+        super().__init__(channel, sender_id, receiver_id)
+        self.bounded_queue = bounded_queue
+        self.on_rejected = on_rejected
+        self.channel_metrics = None
+        bounded_queue.on_dropped = self.__on_dropped__
+
+    def set_channel_metrics(self, channel_metrics):
+        self.channel_metrics = channel_metrics
+        self.inner_channel.set_channel_metrics(channel_metrics)
+
+    def deliver_message(self, send_message_callback, message):
+        slot = self.bounded_queue.acquire()
+        if slot is None:
+            if self.bounded_queue.policy == OverflowPolicy.signal:
+                # for the metrics rejected message is a dropped one
+                self.__on_dropped__()
+                self.on_rejected(message)
+            return None
+        task_info = self.inner_channel.deliver_message(
+            BoundedChannel.DeliveryCallback(self.bounded_queue, slot, send_message_callback),
+            message
+        )
+        self.bounded_queue.attach(slot, task_info)
+        return task_info
+
+    def __on_dropped__(self):
+        if self.channel_metrics is not None:
+            self.channel_metrics.dropped_count += 1
+
+    class DeliveryCallback:
+        __slots__ = ("bounded_queue", "slot", "send_message_callback")
+
+        def __init__(self, bounded_queue, slot, send_message_callback):
+            self.bounded_queue = bounded_queue
+            self.slot = slot
+            self.send_message_callback = send_message_callback
+
+        def __call__(self, message):
+            if self.bounded_queue.release(self.slot):
+                return self.send_message_callback(message)
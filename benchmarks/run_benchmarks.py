@@ -0,0 +1,375 @@
+"""
+Benchmarks of the simulator core, run from the repository root:
+python -m benchmarks.run_benchmarks --output results.json [--quick] [--compare previous_results.json]
+Every case runs in its own OS process, so peak RSS and thread count belong to that case only
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from threading import Event
+
+try:
+    import resource
+except ImportError:
+    # Unix only, peak RSS isn't reported elsewhere
+    resource = None
+
+import numpy as np
+
+from configuration_objects.topology_loader import Topology
+from distibuted_system import DistributedSystemBuilder
+from distributed_objects.channel import SimpleDelayChannel
+from distributed_objects.process import AbstractProcess, SimpleEchoProcess
+from metrics import Histogram, HandlerMetrics
+from taskexecutor import WorkerPoolExecutor, ThreadPerHandlerExecutor
+from taskhandler import TaskHandler
+
+flood_channel_delay_range = [0.001, 0.005]
+
+
+def get_peak_rss_kb() -> int | None:
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes everywhere else
+    return peak_rss // 1024 if sys.platform == "darwin" else peak_rss
+
+
+def create_result(throughput, latency: Histogram | None = None, threads_count=None, **details):
+    return {
+        "throughput": throughput,
+        "latency_p50": latency.get_percentile(50) if latency is not None else None,
+        "latency_p99": latency.get_percentile(99) if latency is not None else None,
+        "peak_rss_kb": get_peak_rss_kb(),
+        "threads": threads_count if threads_count is not None else threading.active_count(),
+        **details
+    }
+
+
+def benchmark_schedule_throughput(tasks_count):
+    """
+    instant tasks per second scheduled from one thread and performed by one handler
+    """
+    task_handler = TaskHandler("benchmark")
+    task_handler.start()
+    done_event = Event()
+    started_at = time.perf_counter()
+    for _ in range(tasks_count - 1):
+        task_handler.schedule_action(int)
+    task_handler.schedule_action(done_event.set)
+    done_event.wait()
+    elapsed_time = time.perf_counter() - started_at
+    threads_count = threading.active_count()
+    task_handler.stop()
+    return create_result(tasks_count / elapsed_time, threads_count=threads_count, elapsed_time=elapsed_time)
+
+
+def benchmark_delayed_tasks_accuracy(tasks_count, max_delay):
+    """
+    lateness of delayed tasks while the handler is also busy with a stream of instant tasks
+    """
+    task_handler = TaskHandler("benchmark")
+    handler_metrics = HandlerMetrics()
+    task_handler.set_metrics(handler_metrics)
+    task_handler.start()
+    done_event = Event()
+    remaining_count = [tasks_count]
+
+    def on_delayed_task():
+        remaining_count[0] -= 1
+        if remaining_count[0] == 0:
+            done_event.set()
+
+    random_delays = np.random.default_rng(0).uniform(0, max_delay, tasks_count).tolist()
+    started_at = time.perf_counter()
+    for delay in random_delays:
+        task_handler.schedule_action(on_delayed_task, delay)
+        task_handler.schedule_action(int)
+    done_event.wait()
+    elapsed_time = time.perf_counter() - started_at
+    threads_count = threading.active_count()
+    task_handler.stop()
+    return create_result(
+        tasks_count / elapsed_time,
+        handler_metrics.timer_lateness,
+        threads_count,
+        max_lateness=handler_metrics.timer_lateness.max
+    )
+
+
+class PingPongProcess(AbstractProcess):
+    """
+    process 0 and process 1 send one message back and forth, done_event is set after rounds_count round trips
+    """
+
+    def __init__(self, process_id, rounds_count, done_event):
+        super().__init__()
+        self.process_id = process_id
+        self.rounds_count = rounds_count
+        self.done_event = done_event
+
+    def get_id(self):
+        return self.process_id
+
+    def is_init_process(self):
+        return self.process_id == 0
+
+    def _on_receive_message_(self, message):
+        if message == AbstractProcess.kick_off_message:
+            message = 0
+        if self.process_id == 0:
+            if message == self.rounds_count:
+                self.done_event.set()
+                return
+            message += 1
+        self.send_message(1 - self.process_id, message)
+
+
+def benchmark_send_latency(rounds_count):
+    """
+    time from send_message until the receiver's mailbox through a channel without delay
+    """
+    done_event = Event()
+    builder = DistributedSystemBuilder()
+    for process_id in (0, 1):
+        builder.add_process(PingPongProcess(process_id, rounds_count, done_event))
+    builder.add_channel(SimpleDelayChannel([0, 0]), 0, 1)
+    builder.add_channel(SimpleDelayChannel([0, 0]), 1, 0)
+    distributed_system = builder.build()
+    registry = distributed_system.enable_metrics()
+
+    started_at = time.perf_counter()
+    distributed_system.start()
+    done_event.wait()
+    elapsed_time = time.perf_counter() - started_at
+    threads_count = threading.active_count()
+    distributed_system.stop(True)
+
+    latency = Histogram()
+    for channel_metrics in registry.channel_metrics.values():
+        latency.merge(channel_metrics.latency)
+    return create_result(2 * rounds_count / elapsed_time, latency, threads_count, elapsed_time=elapsed_time)
+
+
+def create_topology(topology_name, processes_count) -> Topology:
+    """
+    every edge goes both ways, grid is the largest square with at most processes_count nodes
+    """
+    indexes = np.arange(processes_count, dtype=np.int64)
+    if topology_name == "ring":
+        senders, receivers = indexes, (indexes + 1) % processes_count
+    elif topology_name == "grid":
+        side = math.isqrt(processes_count)
+        processes_count = side * side
+        cells = np.arange(processes_count, dtype=np.int64).reshape(side, side)
+        senders = np.concatenate([cells[:, :-1].ravel(), cells[:-1, :].ravel()])
+        receivers = np.concatenate([cells[:, 1:].ravel(), cells[1:, :].ravel()])
+    elif topology_name == "complete":
+        senders, receivers = np.triu_indices(processes_count, 1)
+    else:
+        raise ValueError(f"Unknown topology {topology_name}")
+    return Topology(
+        range(processes_count),
+        np.concatenate([senders, receivers]),
+        np.concatenate([receivers, senders])
+    )
+
+
+class CountingEchoProcess(SimpleEchoProcess):
+    """
+    counts handled messages itself, so the flood is measured without metrics
+    """
+
+    def __init__(self, process_id):
+        super().__init__(process_id)
+        self.received_count = 0
+
+    def _on_receive_message_(self, message):
+        self.received_count += 1
+        super()._on_receive_message_(message)
+
+
+def benchmark_echo_flood(topology_name, processes_count, duration, executor_name, with_metrics):
+    """
+    SimpleEchoProcess forwards every message to all its neighbours, one message started at process 0
+    floods the graph, throughput is messages handled per second during duration.
+    Latency is measured only with_metrics, its channels and handlers' metrics make throughput lower
+    """
+    topology = create_topology(topology_name, processes_count)
+    builder = DistributedSystemBuilder()
+    executor = WorkerPoolExecutor() if executor_name == "pool" else ThreadPerHandlerExecutor()
+    builder.set_task_executor(executor)
+    builder.add_topology(
+        topology,
+        CountingEchoProcess,
+        lambda sender_id, receiver_id: SimpleDelayChannel(flood_channel_delay_range)
+    )
+    distributed_system = builder.build()
+    registry = distributed_system.enable_metrics() if with_metrics else None
+    distributed_system.start()
+    distributed_system.communication_helper.get_process_with_id(0).receive_message("flood")
+
+    started_at = time.perf_counter()
+    time.sleep(duration)
+    distributed_system.pause()
+    elapsed_time = time.perf_counter() - started_at
+    threads_count = threading.active_count()
+
+    processes = distributed_system.communication_helper.get_all_processes()
+    received_count = sum(process.received_count for process in processes)
+    latency = None
+    if registry is not None:
+        latency = Histogram()
+        for channel_metrics in list(registry.channel_metrics.values()):
+            latency.merge(channel_metrics.latency)
+    distributed_system.stop(True)
+    if isinstance(executor, WorkerPoolExecutor):
+        executor.shutdown()
+    return create_result(
+        received_count / elapsed_time,
+        latency,
+        threads_count,
+        processes_count=topology.get_processes_count(),
+        channels_count=topology.get_edges_count(),
+        received_messages=received_count
+    )
+
+
+benchmark_functions = {
+    "schedule_throughput": benchmark_schedule_throughput,
+    "delayed_tasks_accuracy": benchmark_delayed_tasks_accuracy,
+    "send_latency": benchmark_send_latency,
+    "echo_flood": benchmark_echo_flood
+}
+
+
+def get_cases(is_quick):
+    """
+    :return: (case name, benchmark name, keyword arguments)
+    """
+    scale = 10 if is_quick else 1
+    cases = [
+        ("schedule_throughput", "schedule_throughput", {"tasks_count": 200_000 // scale}),
+        ("delayed_tasks_accuracy", "delayed_tasks_accuracy", {"tasks_count": 20_000 // scale, "max_delay": 1.0}),
+        ("send_latency", "send_latency", {"rounds_count": 20_000 // scale})
+    ]
+    # complete graph has processes_count squared channels, 256 processes already take about 0.7 GB
+    flood_sizes = {
+        "ring": [4, 64] if is_quick else [4, 64, 1024, 4096],
+        "grid": [4, 64] if is_quick else [4, 64, 1024, 4096],
+        "complete": [4, 16] if is_quick else [4, 16, 64, 256]
+    }
+    duration = 0.5 if is_quick else 2.0
+    for (topology_name, sizes) in flood_sizes.items():
+        for processes_count in sizes:
+            # a thread for every process and channel stops being realistic on large graphs
+            executor_names = ["pool"] if processes_count > 64 else ["pool", "thread"]
+            for executor_name in executor_names:
+                for with_metrics in (False, True):
+                    cases.append((
+                        f"echo_flood/{topology_name}/{processes_count}/{executor_name}" +
+                        ("/metrics" if with_metrics else ""),
+                        "echo_flood",
+                        {
+                            "topology_name": topology_name,
+                            "processes_count": processes_count,
+                            "duration": duration,
+                            "executor_name": executor_name,
+                            "with_metrics": with_metrics
+                        }
+                    ))
+    return cases
+
+
+def run_case(benchmark_name, arguments, result_queue):
+    try:
+        result_queue.put(benchmark_functions[benchmark_name](**arguments))
+    except Exception as exception:
+        result_queue.put({"error": repr(exception)})
+
+
+def run_case_in_own_process(benchmark_name, arguments, timeout):
+    result_queue = multiprocessing.Queue()
+    case_process = multiprocessing.Process(target=run_case, args=(benchmark_name, arguments, result_queue))
+    case_process.start()
+    try:
+        return result_queue.get(timeout=timeout)
+    except Exception:
+        return {"error": "timeout"}
+    finally:
+        case_process.join(1)
+        if case_process.is_alive():
+            case_process.kill()
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(results, previous_results):
+    """
+    prints relative change of throughput and p99 latency for the cases present in both runs
+    """
+    previous_cases = {case["name"]: case for case in previous_results["cases"]}
+    for case in results["cases"]:
+        previous_case = previous_cases.get(case["name"])
+        if previous_case is None or "error" in case or "error" in previous_case:
+            continue
+        throughput_change = case["throughput"] / previous_case["throughput"] - 1 if previous_case["throughput"] else 0
+        line = f"{case['name']}: throughput {throughput_change:+.1%}"
+        if case["latency_p99"] is not None and previous_case["latency_p99"]:
+            line += f", p99 latency {case['latency_p99'] / previous_case['latency_p99'] - 1:+.1%}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the distributed system simulator")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes and shorter runs")
+    parser.add_argument("--filter", default="", help="run only cases whose name contains this text")
+    parser.add_argument("--compare", help="results file of a previous run to compare with")
+    parser.add_argument("--timeout", type=float, default=300, help="seconds for one case")
+    arguments = parser.parse_args()
+
+    results = {
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "started_at": time.time(),
+        "cases": []
+    }
+    for (case_name, benchmark_name, case_arguments) in get_cases(arguments.quick):
+        if arguments.filter not in case_name:
+            continue
+        case = {"name": case_name, "parameters": case_arguments}
+        case.update(run_case_in_own_process(benchmark_name, case_arguments, arguments.timeout))
+        results["cases"].append(case)
+        print(json.dumps(case))
+
+    with open(arguments.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    if arguments.compare:
+        with open(arguments.compare) as file:
+            compare_results(results, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
+from array import array
+import numpy as np
 from distributed_objects.channel import AbstractChannel, ChannelWrapper
 from distributed_objects.process import AbstractProcess
-from typing import Dict, Any, List
+from configuration_objects.topology_loader import Topology, TopologyFormat, load_topology, save_topology
+from distributed_objects.delay_model import UniformDelay
+from typing import Dict, Any, List, Sequence, Tuple
 
 
 class ChannelInfoHolder:
@@ -78,11 +82,72 @@ class ProcessInfoHolder:
         return list(self.processes_dictionary.values())
 
 
+class FrozenTopology:
+    """
+    Read-only index of the communication graph, built once the topology is fixed.
+    Everything asked on message send is precomputed in dictionaries, so lookups don't allocate.
+    Edges are also kept in CSR layout for the export: processes are numbered in the order they were added,
+    receivers of sender with index i are neighbours[offsets[i]:offsets[i + 1]]
+    and the channel at the same position in channels belongs to that edge.
+    """
+
+    def __init__(self, channel_info_holder: ChannelInfoHolder, process_info_holder: ProcessInfoHolder):
+        process_ids = list(process_info_holder.processes_dictionary.keys())
+        process_index = {process_id: index for (index, process_id) in enumerate(process_ids)}
+        for (sender_id, receiver_dict) in channel_info_holder.communication_dict.items():
+            for process_id in [sender_id, *receiver_dict.keys()]:
+                if process_id not in process_index:
+                    process_index[process_id] = len(process_ids)
+                    process_ids.append(process_id)
+
+        offsets = array('q', [0])
+        neighbours = array('q')
+        channels: List[ChannelWrapper] = []
+        receivers_ids: Dict[Any, Tuple] = {}
+        channel_by_pair: Dict[Tuple[Any, Any], ChannelWrapper] = {}
+        for sender_id in process_ids:
+            receiver_dict = channel_info_holder.communication_dict.get(sender_id) or {}
+            sender_receivers_ids = []
+            for (receiver_id, channel) in receiver_dict.items():
+                if not channel.inner_channel:
+                    continue
+                neighbours.append(process_index[receiver_id])
+                channels.append(channel)
+                sender_receivers_ids.append(receiver_id)
+                channel_by_pair[(sender_id, receiver_id)] = channel
+            offsets.append(len(neighbours))
+            receivers_ids[sender_id] = tuple(sender_receivers_ids)
+
+        self.process_ids: Tuple = tuple(process_ids)
+        self.process_by_id: Dict[Any, AbstractProcess] = {
+            process_id: process for (process_id, process) in process_info_holder.processes_dictionary.items()
+            if isinstance(process, AbstractProcess)
+        }
+        self.all_processes: Tuple[AbstractProcess, ...] = tuple(process_info_holder.get_all_processes())
+        self.offsets = offsets
+        self.neighbours = neighbours
+        self.channels: Tuple[ChannelWrapper, ...] = tuple(channels)
+        self.receivers_ids = receivers_ids
+        self.channel_by_pair = channel_by_pair
+
+
 class CommunicationHelper:
     def __init__(self):
         self.channel_info_holder = ChannelInfoHolder()
         self.process_info_holder = ProcessInfoHolder()
         self.init_processes: Dict[Any, AbstractProcess] = {}
+        # set by freeze, any change of processes or channels drops it
+        self.frozen_topology: FrozenTopology | None = None
+
+    def freeze(self) -> FrozenTopology:
+        """
+        builds read-only index of current topology, lookups don't allocate anything after this call
+        """
+        self.frozen_topology = FrozenTopology(self.channel_info_holder, self.process_info_holder)
+        return self.frozen_topology
+
+    def unfreeze(self):
+        self.frozen_topology = None
 
     def check_is_everything_ok(self, should_print: bool) -> bool:
         not_set_processes_with_id = []
@@ -113,41 +178,82 @@ class CommunicationHelper:
         return not not_set_processes_with_id and not not_set_channels and not not_found_process_id
 
     def get_channel_for(self, sender_id, receiver_id) -> AbstractChannel | None:
+        if self.frozen_topology is not None:
+            return self.frozen_topology.channel_by_pair.get((sender_id, receiver_id))
         channel = self.channel_info_holder.get_channel_for(sender_id, receiver_id)
         return channel if isinstance(channel, ChannelWrapper) and channel.inner_channel is not None else None
 
-    def get_available_receivers_id_for(self, sender_id) -> List:
+    def get_available_receivers_id_for(self, sender_id) -> Sequence:
+        if self.frozen_topology is not None:
+            return self.frozen_topology.receivers_ids.get(sender_id, ())
         return self.channel_info_holder.get_available_receiver_id_for(sender_id)
 
-    def get_all_channels(self) -> List[AbstractChannel]:
+    def get_all_channels(self) -> Sequence[AbstractChannel]:
+        if self.frozen_topology is not None:
+            return self.frozen_topology.channels
         return self.channel_info_holder.get_all_channels()
 
-    def get_all_processes(self) -> List[AbstractProcess]:
+    def get_all_processes(self) -> Sequence[AbstractProcess]:
+        if self.frozen_topology is not None:
+            return self.frozen_topology.all_processes
         return self.process_info_holder.get_all_processes()
 
     def set_channel_for(self, channel: AbstractChannel, sender_id, receiver_id):
+        self.unfreeze()
         self.channel_info_holder.set_channel_for(sender_id, receiver_id, channel)
 
     def remove_channel_for(self, sender_id, receiver_id):
+        self.unfreeze()
         self.channel_info_holder.remove_channel(sender_id, receiver_id)
 
     def get_process_with_id(self, process_id) -> AbstractProcess | None:
+        if self.frozen_topology is not None:
+            return self.frozen_topology.process_by_id.get(process_id)
         return self.process_info_holder.get_process(process_id)
 
     def set_process(self, process: AbstractProcess):
+        self.unfreeze()
         self.process_info_holder.set_process(process)
 
     def remove_process(self, process_id):
+        self.unfreeze()
         self.process_info_holder.remove_process(process_id)
         self.channel_info_holder.remove_process(process_id)
 
     def create_graph_file(self, path):
         """
-        TODO: store here parameters and classes of process and channels
-        TODO: so you don't have to each time setup distributed system
+        stores current topology with channels' delay ranges in binary format, see topology_loader.save_topology
         """
-
-        pass
+        save_topology(path, self.get_topology())
+
+    def get_topology(self) -> Topology:
+        frozen_topology = self.frozen_topology
+        if frozen_topology is None:
+            frozen_topology = FrozenTopology(self.channel_info_holder, self.process_info_holder)
+
+        offsets = np.frombuffer(frozen_topology.offsets, dtype=np.int64)
+        senders = np.repeat(np.arange(len(frozen_topology.process_ids), dtype=np.int64), np.diff(offsets))
+        receivers = np.frombuffer(frozen_topology.neighbours, dtype=np.int64).copy()
+        delay_ranges = [self.__get_delay_range__(channel.inner_channel) for channel in frozen_topology.channels]
+        has_delay_ranges = all(delay_range is not None for delay_range in delay_ranges)
+        return Topology(
+            list(frozen_topology.process_ids),
+            senders,
+            receivers,
+            np.array(delay_ranges, dtype=np.float64).reshape(-1, 2) if has_delay_ranges else None
+        )
+
+    @staticmethod
+    def __get_delay_range__(channel) -> List[float] | None:
+        """
+        [min, max] of uniform delay, None for other delay models, then no channel's delay is stored
+        """
+        delay_range = getattr(channel, "delay_range", None)
+        if isinstance(delay_range, UniformDelay):
+            return [delay_range.min_delay, delay_range.max_delay]
+        if isinstance(delay_range, (list, tuple)) and len(delay_range) == 2:
+            return list(delay_range)
+        return None
 
     def parse_simple_graph(self, path):
         """
@@ -156,17 +262,17 @@ class CommunicationHelper:
 
         pass
 
-    def parse_graph(self, path):
+    def parse_graph(self, path, topology_format=TopologyFormat.adjacency_list):
+        self.set_topology_placeholders(load_topology(path, topology_format))
+
+    def set_topology_placeholders(self, topology: Topology):
+        """
+        replaces processes and channels with placeholders of the topology, they have to be set afterwards
+        """
+        self.unfreeze()
         self.process_info_holder.clear_processes()
         self.channel_info_holder.clear_channels()
-        with open(path) as file:
-            lines = file.readlines()
-
-        for line in lines:
-            data = [s.strip() for s in line.split(":", 1)]
-            sender_id = data[0]
-            self.process_info_holder.set_placeholder(sender_id)
-            receivers_ids = [s.strip() for s in data[1].split(",")]
-            for receiver_id in receivers_ids:
-                self.process_info_holder.set_placeholder(receiver_id)
-                self.channel_info_holder.set_channel_for(sender_id, receiver_id, None)
+        for process_id in topology.process_ids:
+            self.process_info_holder.set_placeholder(process_id)
+        for (sender_id, receiver_id) in topology.iter_edges():
+            self.channel_info_holder.set_channel_for(sender_id, receiver_id, None)
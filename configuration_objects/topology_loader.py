@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import tempfile
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+
+class TopologyFormat:
+    # rows of 0/1 separated by spaces, process ids are [0, 1, 2...], like graph and graph_6 files
+    dense_matrix = "matrix"
+    # "sender receiver" integer pairs, one edge per line
+    edge_list = "edges"
+    # "sender: receiver, receiver" lines, ids are kept as strings, like CommunicationHelper.parse_graph expects
+    adjacency_list = "adjacency"
+    # file written by save_topology, arrays are memory-mapped instead of parsed
+    binary = "binary"
+
+
+class Topology:
+    """
+    Communication graph as two arrays of process indexes, edge i goes from senders[i] to receivers[i].
+    Index k stands for process id process_ids[k].
+    delay_ranges[i] is optional [min, max] delay of the channel of edge i.
+    """
+
+    def __init__(self,
+                 process_ids: Sequence,
+                 senders: np.ndarray,
+                 receivers: np.ndarray,
+                 delay_ranges: np.ndarray | None = None):
+        self.process_ids = process_ids
+        self.senders = senders
+        self.receivers = receivers
+        self.delay_ranges = delay_ranges
+
+    def get_processes_count(self) -> int:
+        return len(self.process_ids)
+
+    def get_edges_count(self) -> int:
+        return len(self.senders)
+
+    def iter_edges(self) -> Iterator[Tuple[Any, Any]]:
+        process_ids = self.process_ids
+        for (sender_index, receiver_index) in zip(self.senders.tolist(), self.receivers.tolist()):
+            yield process_ids[sender_index], process_ids[receiver_index]
+
+    def get_delay_range(self, edge_index) -> List[float] | None:
+        if self.delay_ranges is None:
+            return None
+        return self.delay_ranges[edge_index].tolist()
+
+    def to_adjacency(self) -> Dict[Any, List]:
+        adjacency = {process_id: [] for process_id in self.process_ids}
+        for (sender_id, receiver_id) in self.iter_edges():
+            adjacency[sender_id].append(receiver_id)
+        return adjacency
+
+
+# amount of lines parsed by numpy at once for edge lists
+lines_chunk_size = 1 << 16
+
+
+def load_topology(path, topology_format=None) -> Topology:
+    """
+    reads the file line by line, rows and chunks of lines are parsed straight into numpy arrays
+    :param topology_format: one of TopologyFormat values, guessed from the first line when None
+    """
+    if topology_format is None:
+        topology_format = detect_topology_format(path)
+
+    if topology_format == TopologyFormat.binary:
+        return __load_binary__(path)
+
+    with open(path) as file:
+        if topology_format == TopologyFormat.dense_matrix:
+            return __load_dense_matrix__(file)
+        if topology_format == TopologyFormat.edge_list:
+            return __load_edge_list__(file)
+        if topology_format == TopologyFormat.adjacency_list:
+            return __load_adjacency_list__(file)
+    raise ValueError(f"Unknown topology format {topology_format}")
+
+
+def detect_topology_format(path) -> str:
+    """
+    a file of 0/1 pairs is a matrix only when it has exactly two rows, so a 2x2 matrix and an edge list
+    of two such edges look the same, pass the format explicitly for them
+    """
+    with open(path, "rb") as file:
+        if file.read(len(binary_topology_magic)) == binary_topology_magic:
+            return TopologyFormat.binary
+
+    with open(path) as file:
+        rows = []
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if ":" in line:
+                return TopologyFormat.adjacency_list
+            values = line.split()
+            if len(values) != 2:
+                return TopologyFormat.dense_matrix
+            rows.append(values)
+            if len(rows) > 2:
+                return TopologyFormat.edge_list
+    if len(rows) == 2 and all(value in ("0", "1") for row in rows for value in row):
+        return TopologyFormat.dense_matrix
+    return TopologyFormat.edge_list
+
+
+def __load_dense_matrix__(file) -> Topology:
+    senders = []
+    receivers = []
+    row_index = 0
+    for line in file:
+        if not line.strip():
+            continue
+        row = np.fromstring(line, dtype=np.int8, sep=" ")
+        row_receivers = np.flatnonzero(row)
+        row_receivers = row_receivers[row_receivers != row_index]
+        senders.append(np.full(len(row_receivers), row_index, dtype=np.int64))
+        receivers.append(row_receivers.astype(np.int64, copy=False))
+        row_index += 1
+
+    return Topology(
+        range(row_index),
+        __concatenate__(senders),
+        __concatenate__(receivers)
+    )
+
+
+def __load_edge_list__(file) -> Topology:
+    edges_chunks = []
+    while True:
+        lines = list(islice(file, lines_chunk_size))
+        if not lines:
+            break
+        text = " ".join(line for line in lines if not line.lstrip().startswith("#"))
+        edges_chunks.append(np.fromstring(text, dtype=np.int64, sep=" "))
+
+    edges = __concatenate__(edges_chunks).reshape(-1, 2)
+    process_ids, edge_indexes = np.unique(edges, return_inverse=True)
+    edge_indexes = edge_indexes.reshape(-1, 2)
+    not_loops = edge_indexes[:, 0] != edge_indexes[:, 1]
+    return Topology(
+        process_ids.tolist(),
+        edge_indexes[not_loops, 0],
+        edge_indexes[not_loops, 1]
+    )
+
+
+def __load_adjacency_list__(file) -> Topology:
+    process_index: Dict[str, int] = {}
+    senders_chunks = []
+    receivers_chunks = []
+    for line in file:
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        data = [s.strip() for s in line.split(":", 1)]
+        sender_index = process_index.setdefault(data[0], len(process_index))
+        receivers_ids = [s.strip() for s in data[1].split(",")] if len(data) > 1 else []
+        row_receivers = np.fromiter(
+            (process_index.setdefault(receiver_id, len(process_index)) for receiver_id in receivers_ids if receiver_id),
+            dtype=np.int64
+        )
+        senders_chunks.append(np.full(len(row_receivers), sender_index, dtype=np.int64))
+        receivers_chunks.append(row_receivers)
+
+    return Topology(
+        list(process_index.keys()),
+        __concatenate__(senders_chunks),
+        __concatenate__(receivers_chunks)
+    )
+
+
+def __concatenate__(chunks) -> np.ndarray:
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+
+
+binary_topology_magic = b"DCTOPO01"
+# arrays in binary file start at offsets multiple of this value
+binary_topology_alignment = 8
+
+
+def save_topology(path, topology: Topology):
+    """
+    binary layout: magic, header length (uint64 little endian), json header padded to alignment,
+    then senders and receivers as int64 and optional delay ranges as float64 pairs
+    """
+    process_ids = topology.process_ids
+    is_range = isinstance(process_ids, range) and process_ids.start == 0 and process_ids.step == 1
+    header = json.dumps({
+        "processes_count": len(process_ids),
+        "process_ids": None if is_range else list(process_ids),
+        "edges_count": topology.get_edges_count(),
+        "has_delay_ranges": topology.delay_ranges is not None
+    }).encode()
+    header += b" " * (-(len(binary_topology_magic) + 8 + len(header)) % binary_topology_alignment)
+
+    with open(path, "wb") as file:
+        file.write(binary_topology_magic)
+        file.write(np.uint64(len(header)).astype("<u8").tobytes())
+        file.write(header)
+        np.ascontiguousarray(topology.senders, dtype="<i8").tofile(file)
+        np.ascontiguousarray(topology.receivers, dtype="<i8").tofile(file)
+        if topology.delay_ranges is not None:
+            np.ascontiguousarray(topology.delay_ranges, dtype="<f8").tofile(file)
+
+
+def __load_binary__(path) -> Topology:
+    with open(path, "rb") as file:
+        file.read(len(binary_topology_magic))
+        header_length = int(np.frombuffer(file.read(8), dtype="<u8")[0])
+        header = json.loads(file.read(header_length))
+
+    offset = len(binary_topology_magic) + 8 + header_length
+    edges_count = header["edges_count"]
+
+    def map_array(dtype, shape):
+        nonlocal offset
+        if edges_count == 0:
+            return np.empty(shape, dtype=dtype)
+        array = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=shape)
+        offset += array.nbytes
+        return array
+
+    senders = map_array("<i8", (edges_count,))
+    receivers = map_array("<i8", (edges_count,))
+    delay_ranges = map_array("<f8", (edges_count, 2)) if header["has_delay_ranges"] else None
+    process_ids = header["process_ids"]
+    return Topology(
+        range(header["processes_count"]) if process_ids is None else process_ids,
+        senders,
+        receivers,
+        delay_ranges
+    )
+
+
+# (path, size, modification time) -> topology loaded during this run
+loaded_topologies: Dict[Tuple, Topology] = {}
+
+
+def load_topology_cached(path, topology_format=None, cache_directory=None) -> Topology:
+    """
+    text files are parsed once, then their binary copy from cache_directory is memory-mapped,
+    the cache entry is keyed by file path, size and modification time, so changed files are parsed again
+    """
+    file_stat = os.stat(path)
+    key = (os.path.abspath(path), file_stat.st_size, file_stat.st_mtime_ns)
+    topology = loaded_topologies.get(key)
+    if topology is not None:
+        return topology
+
+    if cache_directory is None:
+        cache_directory = os.path.join(tempfile.gettempdir(), "distributed_computations_topologies")
+    cache_path = os.path.join(
+        cache_directory,
+        hashlib.sha256(repr(key).encode()).hexdigest() + ".topology"
+    )
+
+    if os.path.exists(cache_path):
+        topology = __load_binary__(cache_path)
+    else:
+        topology = load_topology(path, topology_format)
+        os.makedirs(cache_directory, exist_ok=True)
+        # written aside and renamed, so concurrent sweeps never map a half written file
+        temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+        save_topology(temporary_path, topology)
+        os.replace(temporary_path, cache_path)
+        topology = __load_binary__(cache_path)
+
+    loaded_topologies[key] = topology
+    return topology
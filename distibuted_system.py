@@ -1,8 +1,20 @@
-from taskhandler import TaskHandler, Task
+from taskhandler import TaskHandler, PausableClock
+from taskexecutor import TaskExecutor, VirtualTimeExecutor, ThreadPerHandlerExecutor
 from distributed_objects.channel import AbstractChannel
-from typing import List
+import time
+from functools import partial
+from itertools import count
+from threading import Condition
+from typing import Callable, Any, Dict, Tuple, Sequence
 from distributed_objects.process import ChannelCommunicationProvider, AbstractProcess
 from configuration_objects.communication_helper import CommunicationHelper
+from execution_trace import TraceRecorder, TraceEvent
+from replay import ReplaySchedule, ReplayChannel
+from metrics import MetricsRegistry, MeteredChannel
+from profiler import Profiler, ProfiledChannel
+from backpressure import BoundedQueue, BoundedChannel, OverflowPolicy
+from distributed_objects.snapshot import GlobalSnapshot, ProcessSnapshotRecorder
+from configuration_objects.topology_loader import Topology, load_topology, load_topology_cached
 
 
 class DistributedSystem:
@@ -12,13 +24,58 @@ class DistributedSystem:
 
     def __init__(self, communication_helper=None):
         self.main_task_handler = TaskHandler()  # DistributedSystem's handler to avoid main thread blocking
+        self.task_executor: TaskExecutor | None = None
+        # all the handlers follow this clock once the system is started, so pausing it pauses everything
+        self.clock: PausableClock | None = None
+        # called with sender id, receiver id and message when receiver lives in another shard
+        self.remote_delivery: Callable[[Any, Any, Any], None] | None = None
+        # sender id -> receiver id -> (channel, callback delivering message to the receiver), built on start
+        self.routing_table: Dict[Any, Dict[Any, Tuple[AbstractChannel, Callable]]] = {}
+        # sender id -> all its (receiver id, channel, callback), used for broadcasts
+        self.broadcast_routes: Dict[Any, Tuple[Tuple[Any, AbstractChannel, Callable], ...]] = {}
+        self.snapshots_counter = count()
+        # notified by handlers which become idle while run_until_quiescent waits
+        self.quiescence_condition = Condition()
+        self.trace_recorder: TraceRecorder | None = None
+        # set by enable_replay, messages then wait in replay channels until their recorded delivery
+        self.replay_schedule: ReplaySchedule | None = None
+        self.replay_channels: Dict[Tuple[Any, Any], ReplayChannel] = {}
+        self.metrics_registry: MetricsRegistry | None = None
+        self.profiler: Profiler | None = None
+        # (sender id, receiver id) -> limit of messages in the channel, set by the builder
+        self.channel_queues: Dict[Tuple[Any, Any], BoundedQueue] = {}
         self.has_started = False
         if communication_helper:
             self.communication_helper = communication_helper
         else:
             self.communication_helper = CommunicationHelper()
 
+    def set_task_executor(self, executor: TaskExecutor):
+        """
+        should be called before start, moves all the handlers of the system to the executor
+        """
+        self.task_executor = executor
+        self.main_task_handler.set_executor(executor)
+        for process in self.communication_helper.get_all_processes():
+            process.set_task_executor(executor)
+
+        for channel in self.communication_helper.get_all_channels():
+            channel.set_task_executor(executor)
+
+    def set_remote_delivery(self, remote_delivery: Callable[[Any, Any, Any], None]):
+        """
+        used by ShardedDistributedSystem to pass messages whose receiver isn't a process of this system
+        """
+        self.remote_delivery = remote_delivery
+
     def pause(self):
+        """
+        costs the same no matter how many messages are in flight
+        """
+        if self.clock is not None:
+            self.clock.pause()
+            return
+
         self.main_task_handler.pause()
         for process in self.communication_helper.get_all_processes():
             process.pause()
@@ -27,6 +84,9 @@ class DistributedSystem:
             channel.pause()
 
     def unpause(self):
+        if self.clock is not None:
+            self.clock.unpause()
+        # handlers sleeping while the clock was paused have to be woken up
         self.main_task_handler.unpause()
         for process in self.communication_helper.get_all_processes():
             process.unpause()
@@ -35,6 +95,9 @@ class DistributedSystem:
             channel.unpause()
 
     def stop(self, is_instant=False):
+        for bounded_queue in self.__get_bounded_queues__():
+            bounded_queue.close()
+
         for process in self.communication_helper.get_all_processes():
             process.stop(is_instant)
 
@@ -46,7 +109,19 @@ class DistributedSystem:
         else:
             self.main_task_handler.stop()
 
+    def __share_clock__(self):
+        self.clock = PausableClock(self.main_task_handler.executor.now)
+        self.main_task_handler.set_source_clock(self.clock)
+        for process in self.communication_helper.get_all_processes():
+            process.set_source_clock(self.clock)
+
+        for channel in self.communication_helper.get_all_channels():
+            channel.set_source_clock(self.clock)
+
     def start(self):
+        if not self.has_started:
+            self.__check_overflow_policies__()
+            self.__share_clock__()
         self.main_task_handler.start()
         init_processes = [proc for proc in self.communication_helper.get_all_processes() if proc.is_init_process()]
 
@@ -61,8 +136,276 @@ class DistributedSystem:
 
         if not self.has_started:
             self.has_started = True
+            self.__create_routing_table__()
+            self.__create_snapshot_recorders__()
             self.main_task_handler.schedule_action(component_start)
 
+    def run_simulation(self, until_time=None, max_events=None) -> float:
+        """
+        only for systems built with VirtualTimeExecutor, start should be called before
+        performs all the events in simulated time order on the calling thread without real waiting
+        :return: simulated time at which the run ended
+        """
+        if not isinstance(self.task_executor, VirtualTimeExecutor):
+            raise RuntimeError("Simulation can be run only with VirtualTimeExecutor")
+        return self.task_executor.run(until_time, max_events)
+
+    def run_until_quiescent(self, timeout=None) -> bool:
+        """
+        starts the system if needed and returns as soon as the algorithm has finished: every mailbox and channel is
+        empty and no process is performing an action. is_in_terminal_state isn't consulted, only the handlers are.
+        Every handler which becomes idle wakes the caller up, so it doesn't poll.
+        Messages to other shards aren't tracked
+        :param timeout: seconds to wait, None waits forever, simulated seconds for VirtualTimeExecutor
+        :return: True if the system is quiescent, False on timeout
+        """
+        if not self.has_started:
+            self.start()
+        if isinstance(self.task_executor, VirtualTimeExecutor):
+            until_time = None if timeout is None else self.task_executor.now() + timeout
+            self.task_executor.run(until_time)
+            return self.is_quiescent()
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        task_handlers = self.__get_all_task_handlers__()
+        for task_handler in task_handlers:
+            task_handler.on_drained = self.__on_handler_drained__
+        try:
+            # held while checking, so a handler drained after the check waits to notify until wait releases it
+            with self.quiescence_condition:
+                while not self.is_quiescent():
+                    if deadline is None:
+                        self.quiescence_condition.wait()
+                        continue
+                    time_left = deadline - time.monotonic()
+                    if time_left <= 0:
+                        return False
+                    self.quiescence_condition.wait(time_left)
+                return True
+        finally:
+            for task_handler in task_handlers:
+                task_handler.on_drained = None
+
+    def __on_handler_drained__(self):
+        with self.quiescence_condition:
+            self.quiescence_condition.notify_all()
+
+    def is_quiescent(self) -> bool:
+        """
+        two passes over all the handlers, the second one makes sure nothing was performed during the first one,
+        so a message moving between already checked and not yet checked handlers isn't missed
+        """
+        first_pass = self.__get_taken_tasks_if_idle__()
+        if first_pass is None:
+            return False
+        return self.__get_taken_tasks_if_idle__() == first_pass
+
+    def __get_taken_tasks_if_idle__(self) -> list | None:
+        """
+        :return: taken tasks count of every handler, None if any of them isn't idle
+        """
+        taken_tasks = []
+        for task_handler in self.__get_all_task_handlers__():
+            if not task_handler.is_idle():
+                return None
+            taken_tasks.append(task_handler.taken_tasks_count)
+        return taken_tasks
+
+    def __get_all_task_handlers__(self) -> list:
+        task_handlers = [self.main_task_handler]
+        for channel in self.communication_helper.get_all_channels():
+            task_handlers += channel.get_task_handlers()
+        for process in self.communication_helper.get_all_processes():
+            task_handlers.append(process.task_handler)
+        return task_handlers
+
+    def enable_replay(self, replay_schedule: ReplaySchedule):
+        """
+        should be called before start on a system built with VirtualTimeExecutor and the same processes as recorded,
+        channels' delays are skipped and messages are delivered in the recorded order, see run_replay
+        """
+        if not isinstance(self.task_executor, VirtualTimeExecutor):
+            raise RuntimeError("Replay can be run only with VirtualTimeExecutor")
+        self.replay_schedule = replay_schedule
+
+    def run_replay(self) -> int:
+        """
+        delivers recorded messages one by one, every delivery is fully handled before the next one
+        :return: amount of replayed deliveries, less than recorded if the run diverged from the recording
+        """
+        self.task_executor.run()
+        replayed_count = 0
+        for (sender_id, receiver_id, ordinal) in self.replay_schedule.deliveries:
+            replay_channel = self.replay_channels.get((sender_id, receiver_id))
+            if replay_channel is None or not replay_channel.deliver_recorded(ordinal):
+                break
+            self.task_executor.run()
+            replayed_count += 1
+        return replayed_count
+
+    def enable_metrics(self) -> MetricsRegistry:
+        """
+        should be called before start, afterwards every handler measures its timers' lateness, queue depth and
+        utilisation and every channel counts sent, delivered and dropped messages and their latency.
+        Costs nothing while metrics aren't enabled
+        """
+        registry = MetricsRegistry()
+        self.main_task_handler.set_metrics(registry.create_handler_metrics("system"))
+        for process in self.communication_helper.get_all_processes():
+            process_id = process.get_id()
+            process.task_handler.set_metrics(registry.create_handler_metrics(f"process {process_id}"))
+            registry.process_handlers[process_id] = process.task_handler
+
+        for channel in self.communication_helper.get_all_channels():
+            for (task_handler, name) in self.__get_channel_task_handlers__(channel):
+                task_handler.set_metrics(registry.create_handler_metrics(name))
+        self.metrics_registry = registry
+        return registry
+
+    def get_metrics(self):
+        """
+        may be called while the system runs
+        :return: MetricsRegistry.get_report of the enabled metrics, None if they weren't enabled
+        """
+        if self.metrics_registry is None:
+            return None
+        return self.metrics_registry.get_report()
+
+    def start_profiling(self, sampling_interval=1) -> Profiler:
+        """
+        measures cpu time of processes' message handling per message type and of every handler's tasks,
+        channels' deliver_message is measured only when profiling is started before start
+        :param sampling_interval: measure only every n-th call, for long runs
+        :return: profiler, export its results with Profiler.dump_stats
+        """
+        self.stop_profiling()
+        self.profiler = Profiler(sampling_interval)
+        self.__set_profiler__(self.profiler)
+        return self.profiler
+
+    def stop_profiling(self) -> Profiler | None:
+        """
+        :return: stopped profiler with the results, None if nothing was profiled
+        """
+        profiler = self.profiler
+        if profiler is None:
+            return None
+        self.profiler = None
+        profiler.is_enabled = False
+        self.__set_profiler__(None)
+        return profiler
+
+    def __get_profiler__(self) -> Profiler | None:
+        return self.profiler
+
+    def __set_profiler__(self, profiler: Profiler | None):
+        self.main_task_handler.set_profiler(profiler, "system")
+        for process in self.communication_helper.get_all_processes():
+            process.set_profiler(profiler)
+
+        for channel in self.communication_helper.get_all_channels():
+            for (task_handler, name) in self.__get_channel_task_handlers__(channel):
+                task_handler.set_profiler(profiler, name)
+
+    @staticmethod
+    def __get_channel_task_handlers__(channel) -> list:
+        """
+        :return: (handler, name in metrics and profiles) of every handler of the channel and the channels it wraps,
+        the first one is named after the channel, the others get their handler's name appended
+        """
+        name = f"channel {channel.get_sender_id()}->{channel.get_receiver_id()}"
+        return [
+            (task_handler, name if index == 0 else f"{name} {task_handler.name}")
+            for (index, task_handler) in enumerate(channel.get_task_handlers())
+        ]
+
+    def get_queue_occupancy(self):
+        """
+        may be called while the system runs
+        :return: BoundedQueue.get_summary of every bounded mailbox and channel
+        """
+        return {
+            "mailboxes": {
+                str(process.get_id()): process.mailbox.get_summary()
+                for process in self.communication_helper.get_all_processes() if process.mailbox is not None
+            },
+            "channels": {
+                f"{sender_id}->{receiver_id}": bounded_queue.get_summary()
+                for ((sender_id, receiver_id), bounded_queue) in self.channel_queues.items()
+            }
+        }
+
+    def __get_bounded_queues__(self):
+        bounded_queues = [process.mailbox for process in self.communication_helper.get_all_processes()
+                          if process.mailbox is not None]
+        return bounded_queues + list(self.channel_queues.values())
+
+    def __check_overflow_policies__(self):
+        if self.task_executor is None or isinstance(self.task_executor, ThreadPerHandlerExecutor):
+            return
+        for bounded_queue in self.__get_bounded_queues__():
+            if bounded_queue.policy == OverflowPolicy.block:
+                raise ValueError("OverflowPolicy.block needs a thread per handler, it may deadlock shared threads")
+
+    def __reject_message__(self, sender_id, receiver_id, message):
+        sender = self.communication_helper.get_process_with_id(sender_id)
+        if isinstance(sender, AbstractProcess):
+            sender.task_handler.schedule_action(sender._on_message_rejected_, None, (receiver_id, message))
+
+    def take_snapshot(self, initiator_id=None) -> GlobalSnapshot:
+        """
+        starts marker based (Chandy-Lamport) snapshot without pausing the system,
+        markers travel through the channels together with messages, so a message sent before a marker
+        has to be delivered before it, otherwise the recorded states don't form a consistent cut
+        :param initiator_id: process which records its state first, the first process by default
+        :return: snapshot which is filled in the background, wait for it with GlobalSnapshot.wait
+        :raises RuntimeError: if any channel may reorder messages, use FifoDelayChannel
+        """
+        non_fifo_routes = [
+            f"{sender_id}->{receiver_id}"
+            for (sender_id, routes) in self.routing_table.items()
+            for (receiver_id, (channel, _)) in routes.items()
+            if not channel.is_fifo()
+        ]
+        if non_fifo_routes:
+            raise RuntimeError(
+                f"Snapshot needs FIFO channels, {len(non_fifo_routes)} channels may reorder messages, "
+                f"e.g. {', '.join(non_fifo_routes[:5])}"
+            )
+        processes = [proc for proc in self.communication_helper.get_all_processes() if proc.snapshot_recorder]
+        snapshot = GlobalSnapshot(next(self.snapshots_counter), len(processes))
+        initiator = self.communication_helper.get_process_with_id(initiator_id) if initiator_id is not None else \
+            (processes[0] if processes else None)
+        if initiator is not None and initiator.snapshot_recorder is not None:
+            initiator.task_handler.schedule_action(lambda: initiator.snapshot_recorder.start_snapshot(snapshot))
+        return snapshot
+
+    def start_trace(self, path, capacity=1 << 16) -> TraceRecorder:
+        """
+        records send, channel enqueue, delivery and receive of every message to the binary file,
+        read it with execution_trace.read_trace. Costs nothing while no trace is recorded
+        """
+        self.stop_trace()
+        time_source = self.clock.now if self.clock is not None else self.main_task_handler.__now__
+        process_ids = [process.get_id() for process in self.communication_helper.get_all_processes()]
+        self.trace_recorder = TraceRecorder(path, process_ids, time_source, capacity)
+        for process in self.communication_helper.get_all_processes():
+            process.set_trace_recorder(self.trace_recorder)
+        return self.trace_recorder
+
+    def stop_trace(self) -> TraceRecorder | None:
+        """
+        :return: stopped recorder with its statistics, None if nothing was recorded
+        """
+        trace_recorder = self.trace_recorder
+        if trace_recorder is None:
+            return None
+        self.trace_recorder = None
+        for process in self.communication_helper.get_all_processes():
+            process.set_trace_recorder(None)
+        trace_recorder.stop()
+        return trace_recorder
+
     def get_snapshot(self):
         self.pause()
         channels_information = [channel.get_current_state_information() for channel in
@@ -108,79 +451,181 @@ class DistributedSystem:
     def __set_communication_graph__(self, path):
         self.communication_helper.parse_graph(path)
 
-    def __schedule_instant_task__(self, action):
-        task = Task(
-            action,
-            None
-        )
-        self.main_task_handler.schedule_task(task)
-
-    def __create_channel_message_callback__(self, receiver_id):
+    def __create_channel_message_callback__(self, sender_id, receiver_id):
         """
         callback to send message to process
+        :param sender_id: id of a process which sent the message
         :param receiver_id: id of a process which should receive the message
-        :return: callback to communicate with distributed system in proper way
+        :return: callback putting message straight to the receiver's mailbox
         """
+        process = self.communication_helper.get_process_with_id(receiver_id)
+        if isinstance(process, AbstractProcess):
+            return partial(process.receive_message_from, sender_id)
+
+        def send_to_remote_process(message):
+            if self.remote_delivery is not None:
+                self.remote_delivery(sender_id, receiver_id, message)
 
-        def send_to_process(message):
-            process = self.communication_helper.get_process_with_id(receiver_id)
-            if process is None:
-                return
-            process.receive_message(message)
+        return send_to_remote_process
 
-        def callback(message):
-            self.__schedule_instant_task__(
-                lambda: send_to_process(message)
+    def __create_routing_table__(self):
+        """
+        topology doesn't change once the system is started,
+        so the channel and the receiver's callback are found once for every pair of processes
+        and messages go sender -> channel -> receiver's mailbox without passing main_task_handler
+        """
+        routing_table = {}
+        for channel in self.communication_helper.get_all_channels():
+            sender_id = channel.get_sender_id()
+            receiver_id = channel.get_receiver_id()
+            routing_table.setdefault(sender_id, {})[receiver_id] = (
+                self.__get_route_channel__(channel, sender_id, receiver_id),
+                self.__create_channel_message_callback__(sender_id, receiver_id)
+            )
+        self.routing_table = routing_table
+        self.broadcast_routes = {
+            sender_id: tuple((receiver_id, channel, callback) for (receiver_id, (channel, callback)) in routes.items())
+            for (sender_id, routes) in routing_table.items()
+        }
+
+    def __get_route_channel__(self, channel, sender_id, receiver_id) -> AbstractChannel:
+        if self.replay_schedule is None:
+            route_channel = channel.inner_channel
+        else:
+            route_channel = ReplayChannel(self.replay_schedule.get_deliveries_counts(sender_id, receiver_id))
+            self.replay_channels[(sender_id, receiver_id)] = route_channel
+        if self.profiler is not None:
+            route_channel = ProfiledChannel(route_channel, self.__get_profiler__, sender_id, receiver_id)
+        bounded_queue = self.channel_queues.get((sender_id, receiver_id))
+        if bounded_queue is not None:
+            route_channel = BoundedChannel(
+                route_channel,
+                bounded_queue,
+                partial(self.__reject_message__, sender_id, receiver_id),
+                sender_id,
+                receiver_id
+            )
+        if self.metrics_registry is not None:
+            route_channel = MeteredChannel(
+                route_channel,
+                self.metrics_registry.create_channel_metrics(sender_id, receiver_id),
+                self.clock.now
             )
+        return route_channel
 
-        return callback
+    def __create_snapshot_recorders__(self):
+        incoming_ids: Dict[Any, list] = {}
+        for (sender_id, routes) in self.routing_table.items():
+            for receiver_id in routes:
+                incoming_ids.setdefault(receiver_id, []).append(sender_id)
 
-    def __schedule_send_message_channel__(self, sender_id, receiver_id, message):
+        for process in self.communication_helper.get_all_processes():
+            process_id = process.get_id()
+            process.set_snapshot_recorder(
+                ProcessSnapshotRecorder(
+                    process,
+                    tuple(incoming_ids.get(process_id, ())),
+                    partial(self.__broadcast_message__, process_id, exclude=())
+                )
+            )
+
+    def __send_message__(self, sender_id, receiver_id, message):
         """
         simulation of message delivery inside channel
-        tries to find proper communication channel and simulate delivery
+        performed on the sender's thread, so messages enter the channel in the order they were sent
         :param sender_id: id of sender process
         :param receiver_id: id of receiver process
         :param message: message to deliver
         """
+        trace_recorder = self.trace_recorder
+        if trace_recorder is not None:
+            trace_recorder.record(TraceEvent.send, sender_id, receiver_id, message)
+        route = self.routing_table.get(sender_id, {}).get(receiver_id)
+        if route is None:
+            return
+        channel, receiver_callback = route
+        if trace_recorder is not None:
+            receiver_callback = trace_recorder.record_channel_enqueue(sender_id, receiver_id, receiver_callback)
+        channel.deliver_message(receiver_callback, message)
+
+    def __broadcast_message__(self, sender_id, message, exclude):
+        """
+        the same message object is put to every channel of the sender in one pass
+        """
+        exclude = self.__get_excluded_ids__(exclude)
+        trace_recorder = self.trace_recorder
+        if trace_recorder is not None:
+            self.__broadcast_message_traced__(trace_recorder, sender_id, message, exclude)
+            return
+        if exclude:
+            for (receiver_id, channel, receiver_callback) in self.broadcast_routes.get(sender_id, ()):
+                if receiver_id not in exclude:
+                    channel.deliver_message(receiver_callback, message)
+        else:
+            for (_, channel, receiver_callback) in self.broadcast_routes.get(sender_id, ()):
+                channel.deliver_message(receiver_callback, message)
 
-        def try_send_message() -> bool:
-            communication_channel = self.communication_helper.get_channel_for(sender_id, receiver_id)
-            if not isinstance(communication_channel, AbstractChannel):
-                return False
-
-            communication_channel.deliver_message(
-                self.__create_channel_message_callback__(receiver_id),
-                message
-            )
-            return True
+    @staticmethod
+    def __get_excluded_ids__(exclude) -> set | frozenset:
+        """
+        :param exclude: one id or a list, tuple or set of ids, a string is a single id
+        """
+        if isinstance(exclude, (set, frozenset)):
+            return exclude
+        if isinstance(exclude, (list, tuple)):
+            return set(exclude)
+        return {exclude}
+
+    def __broadcast_message_traced__(self, trace_recorder: TraceRecorder, sender_id, message, exclude):
+        trace_recorder.record(TraceEvent.send, sender_id, None, message)
+        for (receiver_id, channel, receiver_callback) in self.broadcast_routes.get(sender_id, ()):
+            if receiver_id not in exclude:
+                channel.deliver_message(
+                    trace_recorder.record_channel_enqueue(sender_id, receiver_id, receiver_callback),
+                    message
+                )
 
-        self.__schedule_instant_task__(try_send_message)
+    def __multicast_message__(self, sender_id, receivers_ids, message):
+        trace_recorder = self.trace_recorder
+        if trace_recorder is not None:
+            trace_recorder.record(TraceEvent.send, sender_id, None, message)
+        routes = self.routing_table.get(sender_id, {})
+        for receiver_id in receivers_ids:
+            route = routes.get(receiver_id)
+            if route is not None:
+                channel, receiver_callback = route
+                if trace_recorder is not None:
+                    receiver_callback = trace_recorder.record_channel_enqueue(sender_id, receiver_id, receiver_callback)
+                channel.deliver_message(receiver_callback, message)
 
     class ChannelCommunicationProviderImpl(ChannelCommunicationProvider):
         def __init__(self, distributed_system, sender_id):
             self.distributed_system: DistributedSystem = distributed_system
             self.sender_id = sender_id
 
-        def get_available_process_id(self) -> List:
-            return list(
-                self.distributed_system.communication_helper.get_available_receivers_id_for(self.sender_id)
-            )
+        def get_available_process_id(self) -> Sequence:
+            return self.distributed_system.communication_helper.get_available_receivers_id_for(self.sender_id)
 
         def send_message(self, receiver_id, message) -> None:
-            self.distributed_system.main_task_handler.schedule_action(
-                lambda: self.distributed_system.__schedule_send_message_channel__(
-                    self.sender_id,
-                    receiver_id,
-                    message
-                )
-            )
+            self.distributed_system.__send_message__(self.sender_id, receiver_id, message)
+
+        def broadcast(self, message, exclude=()) -> None:
+            self.distributed_system.__broadcast_message__(self.sender_id, message, exclude)
+
+        def multicast(self, receivers_ids, message) -> None:
+            self.distributed_system.__multicast_message__(self.sender_id, receivers_ids, message)
 
 
 class DistributedSystemBuilder:
     def __init__(self):
         self.communication_helper = CommunicationHelper()
         self.distributed_system = DistributedSystem(self.communication_helper)
+        self.task_executor: TaskExecutor | None = None
+        self.random_seed = None
+        # process id or None for all the processes -> (capacity, overflow policy)
+        self.mailbox_capacities: Dict[Any, Tuple[int, str]] = {}
+        # (sender id, receiver id) or (None, None) for all the channels -> (capacity, overflow policy)
+        self.channel_capacities: Dict[Tuple[Any, Any], Tuple[int, str]] = {}
 
     def check(self):
         self.communication_helper.check_is_everything_ok(True)
@@ -200,9 +645,93 @@ class DistributedSystemBuilder:
     def remove_process(self, process_id):
         self.communication_helper.remove_process(process_id)
 
+    def set_task_executor(self, executor: TaskExecutor):
+        """
+        e.g. WorkerPoolExecutor to run all processes and channels on a fixed amount of threads
+        or VirtualTimeExecutor to simulate delays without waiting for them
+        or AsyncioExecutor to run everything as coroutines on one event loop,
+        by default every process and channel has its own thread
+        """
+        self.task_executor = executor
+        return self
+
     def load_from_file(self, path):
         self.communication_helper.parse_graph(path)
         return self
 
+    def add_topology(self,
+                     topology: Topology,
+                     process_factory: Callable[[Any], AbstractProcess],
+                     channel_factory: Callable[[Any, Any], AbstractChannel]):
+        """
+        adds a process for every node and a channel for every edge of the topology
+        :param process_factory: creates process with given id
+        :param channel_factory: creates channel for given sender and receiver ids,
+        delay range of the edge is passed as the third argument when the topology has them
+        """
+        for process_id in topology.process_ids:
+            self.add_process(process_factory(process_id))
+        for (edge_index, (sender_id, receiver_id)) in enumerate(topology.iter_edges()):
+            if topology.delay_ranges is None:
+                channel = channel_factory(sender_id, receiver_id)
+            else:
+                channel = channel_factory(sender_id, receiver_id, topology.get_delay_range(edge_index))
+            self.add_channel(channel, sender_id, receiver_id)
+        return self
+
+    def load_topology(self, path, process_factory, channel_factory, topology_format=None, use_cache=False):
+        """
+        see topology_loader.load_topology for supported formats
+        :param use_cache: parse text file once and memory-map its binary copy afterwards
+        """
+        if use_cache:
+            topology = load_topology_cached(path, topology_format)
+        else:
+            topology = load_topology(path, topology_format)
+        return self.add_topology(topology, process_factory, channel_factory)
+
+    def set_random_seed(self, seed):
+        """
+        gives every channel its own random stream derived from the seed and channel's ends,
+        with VirtualTimeExecutor the whole run is reproducible
+        """
+        self.random_seed = seed
+        return self
+
+    def set_mailbox_capacity(self, capacity, policy=OverflowPolicy.drop_newest, process_id=None):
+        """
+        limits messages waiting to be handled by the process, by all the processes when process_id is None
+        :param policy: one of OverflowPolicy values, what happens to a message coming to the full mailbox
+        """
+        self.mailbox_capacities[process_id] = (capacity, policy)
+        return self
+
+    def set_channel_capacity(self, capacity, policy=OverflowPolicy.drop_newest, sender_id=None, receiver_id=None):
+        """
+        limits messages travelling through the channel, through every channel when ids are None
+        :param policy: one of OverflowPolicy values, what happens to a message sent to the full channel
+        """
+        self.channel_capacities[(sender_id, receiver_id)] = (capacity, policy)
+        return self
+
     def build(self) -> DistributedSystem:
+        self.__create_bounded_queues__()
+        if self.random_seed is not None:
+            for channel in self.communication_helper.get_all_channels():
+                channel.set_random_seed(f"{self.random_seed}:{channel.get_sender_id()}:{channel.get_receiver_id()}")
+        self.communication_helper.freeze()
+        if self.task_executor is not None:
+            self.distributed_system.set_task_executor(self.task_executor)
         return self.distributed_system
+
+    def __create_bounded_queues__(self):
+        for process in self.communication_helper.get_all_processes():
+            capacity = self.mailbox_capacities.get(process.get_id(), self.mailbox_capacities.get(None))
+            if capacity is not None:
+                process.set_mailbox(BoundedQueue(*capacity), self.distributed_system.__reject_message__)
+
+        for channel in self.communication_helper.get_all_channels():
+            channel_key = (channel.get_sender_id(), channel.get_receiver_id())
+            capacity = self.channel_capacities.get(channel_key, self.channel_capacities.get((None, None)))
+            if capacity is not None:
+                self.distributed_system.channel_queues[channel_key] = BoundedQueue(*capacity)
@@ -1,6 +1,7 @@
-import random
+from collections import deque
 
-from taskhandler import TaskHandler, Task
+from taskhandler import TaskHandler, TaskInfo
+from distributed_objects.delay_model import DelayModel, create_delay_model
 from threading import Lock
 from typing import final
 
@@ -9,10 +10,53 @@ class AbstractChannel:
     def __init__(self):
         self.handler_lock = Lock()
         self.task_handler = TaskHandler("Channel")
-
-    def deliver_message(self, send_message_callback, message):
+        # metrics.ChannelMetrics while metrics are enabled
+        self.channel_metrics = None
+        # set by channels with delays, own random stream, so the channel's delays don't depend on other channels
+        self.delay_model: DelayModel | None = None
+
+    def deliver_message(self, send_message_callback, message) -> TaskInfo | None:
+        """
+        :return: scheduled delivery, descheduling it drops the message, None if the message isn't delivered
+        or its delivery can't be cancelled
+        """
         pass
 
+    def is_fifo(self) -> bool:
+        """
+        messages are delivered in the order they were sent, marker based snapshots rely on it
+        """
+        return False
+
+    def set_random_seed(self, seed):
+        if self.delay_model is not None:
+            self.delay_model.set_random_seed(seed)
+
+    def set_channel_metrics(self, channel_metrics):
+        self.channel_metrics = channel_metrics
+
+    @final
+    def record_dropped_message(self):
+        """
+        should be called by channels for every message they don't deliver
+        """
+        channel_metrics = self.channel_metrics
+        if channel_metrics is not None:
+            channel_metrics.dropped_count += 1
+
+    def set_task_executor(self, executor):
+        with self.handler_lock:
+            if self.task_handler is None:
+                self.task_handler = TaskHandler("Channel", executor)
+            else:
+                self.task_handler.set_executor(executor)
+
+    def set_source_clock(self, source_clock):
+        with self.handler_lock:
+            if self.task_handler is None:
+                self.task_handler = TaskHandler("Channel")
+            self.task_handler.set_source_clock(source_clock)
+
     def start(self):
         with self.handler_lock:
             if self.task_handler is None:
@@ -28,6 +72,12 @@ class AbstractChannel:
     def get_current_state_information(self):
         return "No state information"
 
+    def get_task_handlers(self) -> list:
+        """
+        handlers holding channel's messages, channels with own queues should keep a task scheduled while not empty
+        """
+        return [self.task_handler] if self.task_handler is not None else []
+
     @final
     def __debug_wait__(self):
         if self.task_handler is not None:
@@ -58,10 +108,53 @@ class AbstractChannel:
 
 class SimpleDelayChannel(AbstractChannel):
     def __init__(self, delay_range):
+        """
+        :param delay_range: [min, max] of uniform delay or any DelayModel
+        """
+        super().__init__()
+        self.delay_range = delay_range
+        self.delay_model = create_delay_model(delay_range)
+        self.is_enabled = True
+        self.is_enabled_lock = Lock()
+
+    def disable(self):
+        with self.is_enabled_lock:
+            self.is_enabled = False
+
+    def enable(self):
+        with self.is_enabled_lock:
+            self.is_enabled = True
+
+    def deliver_message(self, send_message_callback, message):
+        if not self.is_enabled:
+            self.record_dropped_message()
+            return None
+
+        self.start()
+        return self.task_handler.schedule_action(send_message_callback, self.delay_model.next_delay(), (message,))
+
+
+class FifoDelayChannel(AbstractChannel):
+    """
+    Delivers messages in the order they were sent: a message is never delivered before the previous one,
+    so its delay is stretched if needed. Messages wait in one queue and only the head has a timer
+    """
+
+    def __init__(self, delay_range):
+        """
+        :param delay_range: [min, max] of uniform delay or any DelayModel
+        """
         super().__init__()
         self.delay_range = delay_range
+        self.delay_model = create_delay_model(delay_range)
         self.is_enabled = True
         self.is_enabled_lock = Lock()
+        self.queue_lock = Lock()
+        self.queue: deque[FifoDelayChannel.QueuedMessage] = deque()
+        # descheduled messages still kept in the queue, removed at once when they take more than a half of it
+        self.descheduled_messages_count = 0
+        self.last_delivery_time = 0.0
+        self.is_timer_armed = False
 
     def disable(self):
         with self.is_enabled_lock:
@@ -72,17 +165,120 @@ class SimpleDelayChannel(AbstractChannel):
             self.is_enabled = True
 
     def deliver_message(self, send_message_callback, message):
+        return self.__enqueue__(send_message_callback, message)
+
+    def is_fifo(self) -> bool:
+        return True
+
+    def get_current_state_information(self):
+        with self.queue_lock:
+            return [queued_message.message for queued_message in self.queue if queued_message.is_scheduled()]
+
+    def __enqueue__(self, send_message_callback, message):
+        """
+        :return: the queued message as TaskInfo, None if channel is disabled
+        """
         if not self.is_enabled:
-            return
+            self.record_dropped_message()
+            return None
 
         self.start()
-        random_value = random.random()
-        random_delay = self.delay_range[0] + (self.delay_range[1] - self.delay_range[0]) * random_value
-        message_delivery_task = Task(
-            lambda: send_message_callback(message),
-            random_delay
-        )
-        self.task_handler.schedule_task(message_delivery_task)
+        random_delay = self.delay_model.next_delay()
+        current_time = self.task_handler.__now__()
+        with self.queue_lock:
+            delivery_time = max(current_time + random_delay, self.last_delivery_time)
+            self.last_delivery_time = delivery_time
+            queued_message = FifoDelayChannel.QueuedMessage(
+                self,
+                send_message_callback,
+                message,
+                delivery_time,
+                delivery_time - current_time
+            )
+            self.queue.append(queued_message)
+            if self.is_timer_armed:
+                return queued_message
+            self.is_timer_armed = True
+        self.task_handler.schedule_action(self.__deliver_ready_messages__, max(0.0, delivery_time - current_time))
+        return queued_message
+
+    def __deliver_ready_messages__(self):
+        """
+        performed by channel's handler when the head's delay ends, delivers every message whose time has come
+        and arms the timer for the new head
+        """
+        current_time = self.task_handler.__now__()
+        ready_messages = []
+        with self.queue_lock:
+            queue = self.queue
+            while queue and queue[0].delivery_time <= current_time:
+                queued_message = queue.popleft()
+                if queued_message.is_scheduled():
+                    ready_messages.append(queued_message)
+                elif self.descheduled_messages_count > 0:
+                    self.descheduled_messages_count -= 1
+            if queue:
+                next_delay = max(0.0, queue[0].delivery_time - current_time)
+            else:
+                next_delay = None
+                self.is_timer_armed = False
+
+        for queued_message in ready_messages:
+            if queued_message.is_scheduled():
+                queued_message.is_delivered = True
+                queued_message.send_message_callback(queued_message.message)
+        if next_delay is not None:
+            self.task_handler.schedule_action(self.__deliver_ready_messages__, next_delay)
+
+    def __on_message_descheduled__(self):
+        with self.queue_lock:
+            self.descheduled_messages_count += 1
+            if self.descheduled_messages_count * 2 <= len(self.queue):
+                return
+            self.queue = deque(queued_message for queued_message in self.queue if queued_message.is_scheduled())
+            self.descheduled_messages_count = 0
+
+    class QueuedMessage(TaskInfo):
+        __slots__ = ("channel", "send_message_callback", "message", "delivery_time", "delay", "is_delivered",
+                     "is_descheduled")
+
+        def __init__(self, channel, send_message_callback, message, delivery_time, delay):
+            self.channel = channel
+            self.send_message_callback = send_message_callback
+            self.message = message
+            self.delivery_time = delivery_time
+            self.delay = delay
+            self.is_delivered = False
+            self.is_descheduled = False
+
+        def deschedule_task(self):
+            """
+            the message is skipped when its turn comes
+            """
+            if self.is_descheduled or self.is_delivered:
+                return
+            self.is_descheduled = True
+            self.channel.__on_message_descheduled__()
+
+        def is_scheduled(self) -> bool:
+            return not self.is_descheduled
+
+        def is_done(self) -> bool:
+            return self.is_delivered
+
+        def get_delay(self) -> float:
+            return self.delay
+
+        def time_left(self) -> float:
+            if not self.is_scheduled() or self.is_done():
+                return -1
+            return max(0.0, self.delivery_time - self.channel.task_handler.__now__())
+
+        def time_left_relative(self) -> float:
+            time_left = self.time_left()
+            if self.delay == 0 or time_left == -1:
+                return 0
+            return min(1.0, time_left / self.delay)
 
 
 class ChannelWrapper(AbstractChannel):
@@ -104,7 +300,22 @@ class ChannelWrapper(AbstractChannel):
         self.receiver_id = receiver_id
 
     def deliver_message(self, send_message_callback, message):
-        self.inner_channel.deliver_message(send_message_callback, message)
+        return self.inner_channel.deliver_message(send_message_callback, message)
+
+    def is_fifo(self) -> bool:
+        return self.inner_channel.is_fifo()
+
+    def set_task_executor(self, executor):
+        self.inner_channel.set_task_executor(executor)
+
+    def set_random_seed(self, seed):
+        self.inner_channel.set_random_seed(seed)
+
+    def set_channel_metrics(self, channel_metrics):
+        self.inner_channel.set_channel_metrics(channel_metrics)
+
+    def set_source_clock(self, source_clock):
+        self.inner_channel.set_source_clock(source_clock)
 
     def start(self):
         self.inner_channel.start()
@@ -112,6 +323,9 @@ class ChannelWrapper(AbstractChannel):
     def get_current_state_information(self):
         return self.inner_channel.get_current_state_information()
 
+    def get_task_handlers(self) -> list:
+        return self.inner_channel.get_task_handlers()
+
     def __debug_wait__(self):
         self.inner_channel.__debug_wait__()
 
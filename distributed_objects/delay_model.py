@@ -0,0 +1,161 @@
+import hashlib
+from typing import List, Sequence
+
+import numpy as np
+
+from execution_trace import TraceEvent
+
+
+def get_integer_seed(seed) -> int:
+    """
+    numpy generators take only integers, so any seed, e.g. the string one given by the builder, is hashed
+    """
+    return int.from_bytes(hashlib.sha256(str(seed).encode()).digest()[:8], "little")
+
+
+class DelayModel:
+    """
+    Channel delay distribution, delays are drawn by numpy in blocks and handed out one by one.
+    Blocks start small and double up to max_block_size, so idle channels don't hold many pre-drawn delays
+    """
+
+    def __init__(self, max_block_size=1024):
+        self.max_block_size = max_block_size
+        self.block_size = 16
+        self.generator = np.random.default_rng()
+        self.delays: List[float] = []
+
+    def set_random_seed(self, seed):
+        self.generator = np.random.default_rng(get_integer_seed(seed))
+        self.delays = []
+        self.block_size = 16
+
+    def next_delay(self) -> float:
+        try:
+            return self.delays.pop()
+        except IndexError:
+            self.delays = np.maximum(self._draw_(self.generator, self.block_size), 0.0).tolist()
+            self.block_size = min(self.block_size * 2, self.max_block_size)
+            return self.delays.pop()
+
+    def _draw_(self, generator: np.random.Generator, size) -> np.ndarray:
+        """
+        implement with the distribution, negative delays are replaced by 0
+        """
+        pass
+
+
+class UniformDelay(DelayModel):
+    def __init__(self, min_delay, max_delay, max_block_size=1024):
+        super().__init__(max_block_size)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+
+    def _draw_(self, generator, size):
+        return generator.uniform(self.min_delay, self.max_delay, size)
+
+
+class ExponentialDelay(DelayModel):
+    """
+    min_delay plus exponentially distributed time with the given mean
+    """
+
+    def __init__(self, mean, min_delay=0.0, max_block_size=1024):
+        super().__init__(max_block_size)
+        self.mean = mean
+        self.min_delay = min_delay
+
+    def _draw_(self, generator, size):
+        return self.min_delay + generator.exponential(self.mean, size)
+
+
+class LogNormalDelay(DelayModel):
+    """
+    :param median: median of the delay
+    :param sigma: standard deviation of the delay's logarithm, the bigger the longer is the right tail
+    """
+
+    def __init__(self, median, sigma, max_block_size=1024):
+        super().__init__(max_block_size)
+        self.median = median
+        self.sigma = sigma
+
+    def _draw_(self, generator, size):
+        return generator.lognormal(np.log(self.median), self.sigma, size)
+
+
+class ParetoDelay(DelayModel):
+    """
+    Heavy-tailed delay, at least min_delay, the smaller alpha the heavier the tail (no finite mean for alpha <= 1).
+    Delays above max_delay are cut to it when max_delay is set
+    """
+
+    def __init__(self, min_delay, alpha, max_delay=None, max_block_size=1024):
+        super().__init__(max_block_size)
+        self.min_delay = min_delay
+        self.alpha = alpha
+        self.max_delay = max_delay
+
+    def _draw_(self, generator, size):
+        delays = self.min_delay * (1 + generator.pareto(self.alpha, size))
+        if self.max_delay is not None:
+            np.minimum(delays, self.max_delay, out=delays)
+        return delays
+
+
+class EmpiricalDelay(DelayModel):
+    """
+    Delays sampled with replacement from observed ones, e.g. measured on a real network or taken from a trace
+    """
+
+    def __init__(self, samples: Sequence[float], max_block_size=1024):
+        super().__init__(max_block_size)
+        self.samples = np.asarray(samples, dtype=np.float64)
+        if len(self.samples) == 0:
+            raise ValueError("Empirical delay needs at least one sample")
+
+    def _draw_(self, generator, size):
+        return generator.choice(self.samples, size)
+
+    @staticmethod
+    def from_file(path):
+        """
+        delays in seconds separated by whitespace or new lines
+        """
+        return EmpiricalDelay(np.loadtxt(path, dtype=np.float64, ndmin=1))
+
+    @staticmethod
+    def from_trace(trace, sender_id=None, receiver_id=None):
+        """
+        time between channel enqueue and delivery of every message in execution_trace.ExecutionTrace,
+        only of the channel sender_id -> receiver_id when both are given
+        """
+        process_index = {process_id: index for (index, process_id) in enumerate(trace.process_ids)}
+        records = trace.records
+        if sender_id is not None and receiver_id is not None:
+            records = records[(records["sender"] == process_index[sender_id]) &
+                              (records["receiver"] == process_index[receiver_id])]
+        # enqueue and delivery records carry the number of the message in its channel
+        enqueue_times = {}
+        delays = []
+        for (event, sender, receiver, message_id, time) in zip(
+                records["event"].tolist(),
+                records["sender"].tolist(),
+                records["receiver"].tolist(),
+                records["message_id"].tolist(),
+                records["time"].tolist()):
+            key = (sender, receiver, message_id)
+            if event == TraceEvent.channel_enqueue:
+                enqueue_times.setdefault(key, []).append(time)
+            elif event == TraceEvent.delivery and enqueue_times.get(key):
+                delays.append(time - enqueue_times[key].pop(0))
+        return EmpiricalDelay(delays)
+
+
+def create_delay_model(delay) -> DelayModel:
+    """
+    :param delay: DelayModel or [min, max] range of uniform delay
+    """
+    if isinstance(delay, DelayModel):
+        return delay
+    return UniformDelay(delay[0], delay[1])
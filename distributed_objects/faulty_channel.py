@@ -0,0 +1,134 @@
+from typing import List
+
+import numpy as np
+
+from distributed_objects.channel import AbstractChannel, ChannelWrapper
+from distributed_objects.delay_model import get_integer_seed
+from taskhandler import TaskHandler
+
+
+class Fault:
+    # bit flags of a decision, drop excludes the others
+    drop = 1
+    duplicate = 2
+    reorder = 4
+
+
+class FaultyChannel(ChannelWrapper):
+    """
+    Wraps any channel and drops, duplicates or holds back messages before they get into it.
+    A held back message waits up to reorder_window seconds, so the messages sent after it may overtake it.
+    Decisions are drawn by numpy in blocks, the same list pop is done for faulty and healthy messages
+    """
+
+    def __init__(self,
+                 channel: AbstractChannel,
+                 drop_probability=0.0,
+                 duplicate_probability=0.0,
+                 reorder_probability=0.0,
+                 reorder_window=0.0,
+                 block_size=1024):
+        super().__init__(channel)
+        self.drop_probability = drop_probability
+        self.duplicate_probability = duplicate_probability
+        self.reorder_probability = reorder_probability
+        self.reorder_window = reorder_window
+        self.block_size = block_size
+        self.generator = np.random.default_rng()
+        self.decisions: List[int] = []
+        self.hold_times: List[float] = []
+        self.channel_metrics = None
+        # held back messages wait here, created only when reordering is on
+        self.task_handler: TaskHandler | None = \
+            TaskHandler("FaultyChannel") if reorder_probability > 0 and reorder_window > 0 else None
+
+    def deliver_message(self, send_message_callback, message):
+        try:
+            decision = self.decisions.pop()
+        except IndexError:
+            self.decisions = self.__draw_decisions__()
+            decision = self.decisions.pop()
+
+        if decision == 0:
+            return self.inner_channel.deliver_message(send_message_callback, message)
+        if decision & Fault.drop:
+            self.record_dropped_message()
+            return None
+        if decision & Fault.reorder and self.task_handler is not None:
+            # only holding back can be cancelled, once handed to the inner channel the message goes on
+            task_info = self.task_handler.schedule_action(
+                self.inner_channel.deliver_message,
+                self.__next_hold_time__(),
+                (send_message_callback, message)
+            )
+        else:
+            task_info = self.inner_channel.deliver_message(send_message_callback, message)
+        if decision & Fault.duplicate:
+            self.inner_channel.deliver_message(send_message_callback, message)
+        return task_info
+
+    def is_fifo(self) -> bool:
+        # held back messages may be overtaken, drops and duplicates keep the order
+        return self.task_handler is None and self.inner_channel.is_fifo()
+
+    def __draw_decisions__(self) -> List[int]:
+        generator = self.generator
+        size = self.block_size
+        decisions = np.where(generator.random(size) < self.duplicate_probability, Fault.duplicate, 0)
+        decisions |= np.where(generator.random(size) < self.reorder_probability, Fault.reorder, 0)
+        decisions[generator.random(size) < self.drop_probability] = Fault.drop
+        return decisions.tolist()
+
+    def __next_hold_time__(self) -> float:
+        try:
+            return self.hold_times.pop()
+        except IndexError:
+            self.hold_times = self.generator.uniform(0, self.reorder_window, self.block_size).tolist()
+            return self.hold_times.pop()
+
+    def set_random_seed(self, seed):
+        self.generator = np.random.default_rng(get_integer_seed(f"{seed}:faults"))
+        self.decisions = []
+        self.hold_times = []
+        self.inner_channel.set_random_seed(seed)
+
+    def set_channel_metrics(self, channel_metrics):
+        self.channel_metrics = channel_metrics
+        self.inner_channel.set_channel_metrics(channel_metrics)
+
+    def get_task_handlers(self) -> list:
+        own_task_handlers = [self.task_handler] if self.task_handler is not None else []
+        return self.inner_channel.get_task_handlers() + own_task_handlers
+
+    def set_task_executor(self, executor):
+        if self.task_handler is not None:
+            self.task_handler.set_executor(executor)
+        self.inner_channel.set_task_executor(executor)
+
+    def set_source_clock(self, source_clock):
+        if self.task_handler is not None:
+            self.task_handler.set_source_clock(source_clock)
+        self.inner_channel.set_source_clock(source_clock)
+
+    def start(self):
+        if self.task_handler is not None:
+            self.task_handler.start()
+        self.inner_channel.start()
+
+    def stop(self, is_instant=False):
+        if self.task_handler is not None:
+            if is_instant:
+                self.task_handler.instant_stop()
+            else:
+                self.task_handler.stop()
+        self.inner_channel.stop(is_instant)
+
+    def pause(self):
+        if self.task_handler is not None:
+            self.task_handler.pause()
+        self.inner_channel.pause()
+
+    def unpause(self):
+        if self.task_handler is not None:
+            self.task_handler.unpause()
+        self.inner_channel.unpause()
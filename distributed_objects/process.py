@@ -1,22 +1,53 @@
-from typing import final, List
+from typing import final, List, Sequence
 from taskhandler import TaskHandler
+from execution_trace import TraceEvent
+from backpressure import BoundedQueue, OverflowPolicy
+from distributed_objects.snapshot import SnapshotMarker
 from threading import Lock
+import inspect
 
 
 class ChannelCommunicationProvider:
-    def get_available_process_id(self) -> List: pass
+    def get_available_process_id(self) -> Sequence:
+        """
+        read-only, the same sequence may be returned on every call
+        """
+        pass
 
     def send_message(self, receiver_id, message) -> None: pass
 
+    def broadcast(self, message, exclude=()) -> None:
+        """
+        sends the message to every available process except the excluded ids
+        :param exclude: one id or a list, tuple or set of ids
+        """
+        pass
+
+    def multicast(self, receivers_ids, message) -> None: pass
+
 
 class AbstractProcess:
     kick_off_message = "Start initially"
+    # sender of the batch items which didn't come through a channel
+    no_sender = object()
 
     def __init__(self):
         self.channel_communication_provider: ChannelCommunicationProvider | None = None
         self.task_handler = TaskHandler("Channel")
         self.is_enabled = True
         self.is_disabled_lock = Lock()
+        # set by DistributedSystem, takes snapshot markers out of the incoming messages
+        self.snapshot_recorder = None
+        # set by DistributedSystem while execution is recorded
+        self.trace_recorder = None
+        # set by DistributedSystem while profiling
+        self.profiler = None
+        # limits messages waiting to be handled when set, see set_mailbox
+        self.mailbox: BoundedQueue | None = None
+        self.on_message_rejected = None
+        # messages are handed over in batches when the subclass implements _on_receive_messages_
+        self.is_batch_receiver = type(self)._on_receive_messages_ is not AbstractProcess._on_receive_messages_
+        self.is_async_batch_receiver = inspect.iscoroutinefunction(self._on_receive_messages_)
 
     def set_channel_communication_provider(self, channel_communication_provider: ChannelCommunicationProvider):
         self.channel_communication_provider = channel_communication_provider
@@ -33,6 +64,23 @@ class AbstractProcess:
     def _on_receive_message_(self, message):
         """
         Implement this method with actual algorithm running on the node
+        Can be declared as async def, then it's awaited before the next message is handled
+        """
+        pass
+
+    def _on_receive_messages_(self, batch: List):
+        """
+        Implement this method instead of _on_receive_message_ to get all the messages which are ready at once,
+        in the order they came. Can be declared as async def as well.
+        Messages are gathered from the first one that comes while no batch is waiting,
+        tasks scheduled on the process's handler in between may run before the batch
+        """
+        pass
+
+    def _on_message_rejected_(self, receiver_id, message):
+        """
+        Called on this process's handler when a message it sent to receiver_id wasn't accepted
+        by a full channel or mailbox with OverflowPolicy.signal
         """
         pass
 
@@ -52,8 +100,158 @@ class AbstractProcess:
     @final
     def receive_message(self, message):
         if self.is_enabled:
+            if self.is_batch_receiver:
+                self.task_handler.schedule_batch_item(
+                    self.__handle_message_batch__,
+                    (AbstractProcess.no_sender, message, None, None)
+                )
+                return
             self.task_handler \
-                .schedule_action(lambda: self._on_receive_message_(message))
+                .schedule_action(self.__call_on_receive_message__, None, (message,))
+
+    @final
+    def set_task_executor(self, executor):
+        self.task_handler.set_executor(executor)
+
+    @final
+    def set_source_clock(self, source_clock):
+        self.task_handler.set_source_clock(source_clock)
+
+    @final
+    def set_snapshot_recorder(self, snapshot_recorder):
+        self.snapshot_recorder = snapshot_recorder
+
+    @final
+    def set_trace_recorder(self, trace_recorder):
+        self.trace_recorder = trace_recorder
+
+    @final
+    def set_mailbox(self, mailbox: BoundedQueue | None, on_message_rejected=None):
+        """
+        :param on_message_rejected: called with sender id, own id and message when mailbox rejects it
+        """
+        self.mailbox = mailbox
+        self.on_message_rejected = on_message_rejected
+
+    @final
+    def set_profiler(self, profiler):
+        self.profiler = profiler
+        self.task_handler.set_profiler(profiler, f"process {self.get_id()}")
+
+    @final
+    def receive_message_from(self, sender_id, message):
+        """
+        delivery of a message which came through the channel from sender_id
+        """
+        if self.is_enabled:
+            mailbox = self.mailbox
+            if mailbox is None:
+                if self.is_batch_receiver:
+                    self.task_handler.schedule_batch_item(
+                        self.__handle_message_batch__,
+                        (sender_id, message, None, None)
+                    )
+                    return
+                self.task_handler \
+                    .schedule_action(self.__handle_message_from__, None, (sender_id, message))
+                return
+            slot = mailbox.acquire()
+            if slot is not None:
+                if self.is_batch_receiver:
+                    task_info = self.task_handler.schedule_batch_item(
+                        self.__handle_message_batch__,
+                        (sender_id, message, mailbox, slot)
+                    )
+                else:
+                    task_info = self.task_handler \
+                        .schedule_action(self.__handle_mailbox_message__, None, (mailbox, slot, sender_id, message))
+                # a message dropped by drop_oldest doesn't stay in the handler's queue
+                mailbox.attach(slot, task_info)
+            elif mailbox.policy == OverflowPolicy.signal and self.on_message_rejected is not None:
+                self.on_message_rejected(sender_id, self.get_id(), message)
+
+    @final
+    def __handle_mailbox_message__(self, mailbox, slot, sender_id, message):
+        if mailbox.release(slot):
+            return self.__handle_message_from__(sender_id, message)
+        return None
+
+    @final
+    def __handle_message_from__(self, sender_id, message):
+        snapshot_recorder = self.snapshot_recorder
+        if snapshot_recorder is not None and snapshot_recorder.intercept(sender_id, message):
+            return None
+        trace_recorder = self.trace_recorder
+        if trace_recorder is not None:
+            trace_recorder.record(TraceEvent.receive, sender_id, self.get_id(), message)
+        if self.profiler is not None:
+            return self.__call_on_receive_message__(message)
+        return self._on_receive_message_(message)
+
+    @final
+    def __handle_message_batch__(self, batch):
+        """
+        :param batch: (sender id, message, mailbox, mailbox slot) of every message
+        """
+        if self.is_async_batch_receiver:
+            return self.__handle_message_batch_async__(batch)
+        for messages in self.__get_batch_segments__(batch):
+            self.__call_on_receive_messages__(messages)
+        return None
+
+    @final
+    async def __handle_message_batch_async__(self, batch):
+        for messages in self.__get_batch_segments__(batch):
+            await self.__call_on_receive_messages__(messages)
+
+    @final
+    def __get_batch_segments__(self, batch):
+        """
+        yields the messages which get to the algorithm, a snapshot marker ends the segment,
+        so the state recorded by the marker includes all the messages which came before it
+        """
+        snapshot_recorder = self.snapshot_recorder
+        trace_recorder = self.trace_recorder
+        messages = []
+        for (sender_id, message, mailbox, slot) in batch:
+            if slot is not None and not mailbox.release(slot):
+                continue
+            if sender_id is not AbstractProcess.no_sender:
+                if snapshot_recorder is not None:
+                    if messages and type(message) is SnapshotMarker:
+                        yield messages
+                        messages = []
+                    if snapshot_recorder.intercept(sender_id, message):
+                        continue
+                if trace_recorder is not None:
+                    trace_recorder.record(TraceEvent.receive, sender_id, self.get_id(), message)
+            messages.append(message)
+        if messages:
+            yield messages
+
+    @final
+    def __call_on_receive_messages__(self, messages):
+        profiler = self.profiler
+        if profiler is None:
+            return self._on_receive_messages_(messages)
+        return profiler.measure(
+            f"process {self.get_id()}",
+            "_on_receive_messages_",
+            self._on_receive_messages_,
+            messages
+        )
+
+    @final
+    def __call_on_receive_message__(self, message):
+        profiler = self.profiler
+        if profiler is None:
+            return self._on_receive_message_(message)
+        return profiler.measure(
+            f"process {self.get_id()}",
+            f"_on_receive_message_({type(message).__name__})",
+            self._on_receive_message_,
+            message
+        )
 
     @final
     def start(self):
@@ -81,7 +279,19 @@ class AbstractProcess:
             .send_message(receiver_id, message)
 
     @final
-    def __get_available_channels__(self) -> List:
+    def broadcast_message(self, message, exclude=()):
+        self \
+            .channel_communication_provider \
+            .broadcast(message, exclude)
+
+    @final
+    def multicast_message(self, receivers_ids, message):
+        self \
+            .channel_communication_provider \
+            .multicast(receivers_ids, message)
+
+    @final
+    def __get_available_channels__(self) -> Sequence:
         return self.channel_communication_provider.get_available_process_id()
 
 
@@ -100,8 +310,7 @@ class SimpleEchoProcess(AbstractProcess):
         return False
 
     def _on_receive_message_(self, message):
-        for receiver_id in self.channel_communication_provider.get_available_process_id():
-            self.channel_communication_provider.send_message(receiver_id, message)
+        self.broadcast_message(message)
 
 
 from dataclasses import dataclass
@@ -134,8 +343,7 @@ class ExampleEchoProcess(AbstractProcess):
         new_message.counter = message.counter + 1
         new_message.time_stamp = time()
 
-        for receiver_id in self.channel_communication_provider.get_available_process_id():
-            self.channel_communication_provider.send_message(receiver_id, new_message)
+        self.broadcast_message(new_message)
 
     @dataclass
     class MyMessage:
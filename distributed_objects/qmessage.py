@@ -3,13 +3,15 @@ import time
 from PyQt5.QtCore import QLineF, QTimer
 from PyQt5.QtGui import QPainterPath, QPainter, QPen, QBrush, QColor
 from PyQt5.QtWidgets import QWidget
-from distributed_objects.channel import AbstractChannel
+from distributed_objects.channel import AbstractChannel, FifoDelayChannel
+from distributed_objects.delay_model import create_delay_model
 from taskhandler import TaskInfo
-from random import random
 from threading import Lock
 
 
 class MessageInfo:
+    __slots__ = ("sender_id", "receiver_id", "task_info")
+
     def __init__(self, sender_id, receiver_id, task_info: TaskInfo):
         self.sender_id = sender_id
         self.receiver_id = receiver_id
@@ -38,6 +40,7 @@ class MessageInfoDelayChannel(AbstractChannel):
         self.receiver_id = receiver_id
         self.message_info_callback = message_info_callback
         self.delay_range = delay_range
+        self.delay_model = create_delay_model(delay_range)
         self.is_enabled = True
         self.is_enabled_lock = Lock()
 
@@ -51,15 +54,12 @@ class MessageInfoDelayChannel(AbstractChannel):
 
     def deliver_message(self, send_message_callback, message):
         if not self.is_enabled:
-            return
+            self.record_dropped_message()
+            return None
 
         self.start()
-        random_value = random()
-        random_delay = self.delay_range[0] + (self.delay_range[1] - self.delay_range[0]) * random_value
-        task_info = self.task_handler.schedule_action(
-            lambda: send_message_callback(message),
-            random_delay
-        )
+        random_delay = self.delay_model.next_delay()
+        task_info = self.task_handler.schedule_action(send_message_callback, random_delay, (message,))
 
         message_info = MessageInfo(
             self.sender_id,
@@ -68,6 +68,29 @@ class MessageInfoDelayChannel(AbstractChannel):
         )
 
         self.message_info_callback(message_info)
+        return task_info
+
+
+class MessageInfoFifoChannel(FifoDelayChannel):
+    def __init__(self, sender_id, receiver_id, delay_range, message_info_callback):
+        super().__init__(delay_range)
+        self.sender_id = sender_id
+        self.receiver_id = receiver_id
+        self.message_info_callback = message_info_callback
+
+    def deliver_message(self, send_message_callback, message):
+        queued_message = self.__enqueue__(send_message_callback, message)
+        if queued_message is None:
+            return None
+
+        message_info = MessageInfo(
+            self.sender_id,
+            self.receiver_id,
+            queued_message
+        )
+
+        self.message_info_callback(message_info)
+        return queued_message
 
 
 message_delay = 10
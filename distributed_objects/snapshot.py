@@ -0,0 +1,121 @@
+from threading import Lock, Event
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class GlobalSnapshot:
+    """
+    Consistent global state collected by markers (Chandy-Lamport), filled while the system keeps running.
+    Channel state is the list of messages which were in the channel when the snapshot was taken.
+    The result is consistent when channels deliver messages in FIFO order
+    and every process can be reached from the initiator.
+    """
+
+    def __init__(self, snapshot_id, processes_count):
+        self.snapshot_id = snapshot_id
+        self.processes_count = processes_count
+        self.lock = Lock()
+        self.done_event = Event()
+        self.process_states: Dict[Any, Any] = {}
+        self.channel_states: Dict[Tuple[Any, Any], List] = {}
+        self.done_processes_count = 0
+        if processes_count == 0:
+            self.done_event.set()
+
+    def wait(self, timeout=None) -> bool:
+        """
+        :return: True if all the processes and channels were recorded
+        """
+        return self.done_event.wait(timeout)
+
+    def is_done(self) -> bool:
+        return self.done_event.is_set()
+
+    def get_result(self):
+        """
+        :return: process information and channel information in the same shape as DistributedSystem.get_snapshot
+        """
+        with self.lock:
+            return list(self.process_states.values()), [list(messages) for messages in self.channel_states.values()]
+
+    def has_process_state(self, process_id) -> bool:
+        return process_id in self.process_states
+
+    def __set_process_state__(self, process_id, state, recorded_channels: List[Tuple[Any, Any]]):
+        with self.lock:
+            self.process_states[process_id] = state
+            for channel_key in recorded_channels:
+                self.channel_states[channel_key] = []
+
+    def __record_channel_message__(self, sender_id, receiver_id, message):
+        with self.lock:
+            self.channel_states[(sender_id, receiver_id)].append(message)
+
+    def __on_process_done__(self):
+        with self.lock:
+            self.done_processes_count += 1
+            if self.done_processes_count == self.processes_count:
+                self.done_event.set()
+
+
+class SnapshotMarker:
+    __slots__ = ("snapshot",)
+
+    def __init__(self, snapshot: GlobalSnapshot):
+        self.snapshot = snapshot
+
+
+class ProcessSnapshotRecorder:
+    """
+    Snapshot part of a process, called only from the process's handler,
+    so the state is recorded exactly between two handled messages
+    """
+
+    def __init__(self, process, incoming_ids: Tuple, send_markers: Callable[[SnapshotMarker], None]):
+        self.process = process
+        self.process_id = process.get_id()
+        self.incoming_ids = incoming_ids
+        self.send_markers = send_markers
+        # snapshot -> ids of senders whose channels are still being recorded
+        self.recorded_channels: Dict[GlobalSnapshot, set] = {}
+
+    def intercept(self, sender_id, message) -> bool:
+        """
+        :return: True if the message was a marker and shouldn't get to the algorithm
+        """
+        if type(message) is SnapshotMarker:
+            self.__on_marker__(sender_id, message.snapshot)
+            return True
+        if self.recorded_channels:
+            for (snapshot, sender_ids) in self.recorded_channels.items():
+                if sender_id in sender_ids:
+                    snapshot.__record_channel_message__(sender_id, self.process_id, message)
+        return False
+
+    def start_snapshot(self, snapshot: GlobalSnapshot):
+        self.__record_state__(snapshot, None)
+
+    def __on_marker__(self, sender_id, snapshot: GlobalSnapshot):
+        sender_ids = self.recorded_channels.get(snapshot)
+        if sender_ids is None:
+            if not snapshot.has_process_state(self.process_id):
+                self.__record_state__(snapshot, sender_id)
+            return
+
+        sender_ids.discard(sender_id)
+        if not sender_ids:
+            del self.recorded_channels[snapshot]
+            snapshot.__on_process_done__()
+
+    def __record_state__(self, snapshot: GlobalSnapshot, marker_sender_id):
+        sender_ids = set(self.incoming_ids)
+        sender_ids.discard(marker_sender_id)
+        snapshot.__set_process_state__(
+            self.process_id,
+            self.process.get_current_state_information(),
+            [(sender_id, self.process_id) for sender_id in self.incoming_ids]
+        )
+        self.send_markers(SnapshotMarker(snapshot))
+        if sender_ids:
+            self.recorded_channels[snapshot] = sender_ids
+        else:
+            snapshot.__on_process_done__()
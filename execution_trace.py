@@ -0,0 +1,180 @@
+import json
+import struct
+from threading import Thread, Lock, Event
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+import numpy as np
+
+
+class TraceEvent:
+    # process called send_message, broadcast or multicast, receiver is -1 for broadcasts
+    send = 0
+    # message was handed to the channel
+    channel_enqueue = 1
+    # channel delivered message to the receiver's mailbox
+    delivery = 2
+    # receiver's _on_receive_message_ is called with the message
+    receive = 3
+
+
+trace_file_magic = b"DCTRACE1"
+# event, sender index, receiver index, message id, time
+# message id is the number of the message in its channel for channel_enqueue and delivery, id() of it otherwise
+trace_record_struct = struct.Struct("<Bxxxiiqd")
+trace_record_dtype = np.dtype({
+    "names": ["event", "sender", "receiver", "message_id", "time"],
+    "formats": ["u1", "<i4", "<i4", "<i8", "<f8"],
+    "offsets": [0, 4, 8, 12, 20],
+    "itemsize": trace_record_struct.size
+})
+
+
+class TraceRecorder:
+    """
+    Writes fixed-size binary records into a preallocated ring buffer, a background thread flushes them to disk.
+    Recording never waits for the disk, if the flusher falls behind by a whole buffer the oldest records are lost
+    and counted in lost_records_count.
+    Processes are written as indexes of process_ids which are stored in the file header.
+    """
+
+    def __init__(self,
+                 path,
+                 process_ids: Sequence,
+                 time_source: Callable[[], float],
+                 capacity=1 << 16,
+                 flush_interval=0.5):
+        self.path = path
+        self.process_index: Dict[Any, int] = {process_id: index for (index, process_id) in enumerate(process_ids)}
+        # (sender id, receiver id) -> amount of messages handed to the channel since recording started
+        self.channel_messages_counts: Dict[Tuple[Any, Any], int] = {}
+        self.time_source = time_source
+        self.capacity = capacity
+        self.record_size = trace_record_struct.size
+        self.buffer = bytearray(capacity * self.record_size)
+        self.lock = Lock()
+        self.written_records_count = 0
+        self.flushed_records_count = 0
+        self.lost_records_count = 0
+        self.flush_interval = flush_interval
+        self.flush_event = Event()
+        self.is_stopped = False
+
+        self.file = open(path, "wb")
+        header = json.dumps({"process_ids": list(process_ids)}).encode()
+        self.file.write(trace_file_magic)
+        self.file.write(struct.pack("<Q", len(header)))
+        self.file.write(header)
+
+        self.flush_thread = Thread(target=self.__flush_loop__, name="TraceRecorder", daemon=True)
+        self.flush_thread.start()
+
+    def record(self, event, sender_id, receiver_id, message):
+        with self.lock:
+            self.__write__(event, sender_id, receiver_id, id(message))
+
+    def record_channel_enqueue(self, sender_id, receiver_id, send_message_callback: Callable) -> Callable:
+        """
+        numbers the message in its channel, unlike id() the number isn't reused after the message is dropped
+        :return: callback to give to the channel instead of send_message_callback, it records the delivery
+        """
+        channel_key = (sender_id, receiver_id)
+        with self.lock:
+            message_number = self.channel_messages_counts.get(channel_key, 0)
+            self.channel_messages_counts[channel_key] = message_number + 1
+            self.__write__(TraceEvent.channel_enqueue, sender_id, receiver_id, message_number)
+        return TraceRecorder.DeliveryCallback(self, sender_id, receiver_id, message_number, send_message_callback)
+
+    def __write__(self, event, sender_id, receiver_id, message_id):
+        """
+        should be called under lock
+        """
+        process_index = self.process_index
+        slot = self.written_records_count % self.capacity
+        trace_record_struct.pack_into(
+            self.buffer,
+            slot * self.record_size,
+            event,
+            process_index.get(sender_id, -1),
+            process_index.get(receiver_id, -1),
+            message_id,
+            self.time_source()
+        )
+        self.written_records_count += 1
+        if self.written_records_count - self.flushed_records_count >= self.capacity // 2:
+            self.flush_event.set()
+
+    def stop(self):
+        """
+        flushes everything recorded and closes the file
+        """
+        self.is_stopped = True
+        self.flush_event.set()
+        self.flush_thread.join()
+        self.file.close()
+
+    def __flush_loop__(self):
+        while not self.is_stopped:
+            self.flush_event.wait(self.flush_interval)
+            self.flush_event.clear()
+            self.__flush__()
+        self.__flush__()
+
+    def __flush__(self):
+        with self.lock:
+            written_records_count = self.written_records_count
+            first_record = max(self.flushed_records_count, written_records_count - self.capacity)
+            self.lost_records_count += first_record - self.flushed_records_count
+            records_count = written_records_count - first_record
+            start_slot = first_record % self.capacity
+            end_slot = start_slot + records_count
+            chunks = [bytes(self.buffer[start_slot * self.record_size:min(end_slot, self.capacity) * self.record_size])]
+            if end_slot > self.capacity:
+                # the records wrapped around the end of the ring
+                chunks.append(bytes(self.buffer[:(end_slot - self.capacity) * self.record_size]))
+            self.flushed_records_count = written_records_count
+
+        for chunk in chunks:
+            self.file.write(chunk)
+        self.file.flush()
+
+
+    class DeliveryCallback:
+        __slots__ = ("trace_recorder", "sender_id", "receiver_id", "message_number", "send_message_callback")
+
+        def __init__(self, trace_recorder, sender_id, receiver_id, message_number, send_message_callback):
+            self.trace_recorder = trace_recorder
+            self.sender_id = sender_id
+            self.receiver_id = receiver_id
+            self.message_number = message_number
+            self.send_message_callback = send_message_callback
+
+        def __call__(self, message):
+            trace_recorder = self.trace_recorder
+            if not trace_recorder.is_stopped:
+                with trace_recorder.lock:
+                    trace_recorder.__write__(TraceEvent.delivery, self.sender_id, self.receiver_id, self.message_number)
+            return self.send_message_callback(message)
+
+
+class ExecutionTrace:
+    def __init__(self, process_ids: list, records: np.ndarray):
+        self.process_ids = process_ids
+        self.records = records
+
+    def get_process_id(self, process_index):
+        return None if process_index < 0 else self.process_ids[process_index]
+
+
+def read_trace(path) -> ExecutionTrace:
+    """
+    records are read as numpy structured array with trace_record_dtype
+    """
+    with open(path, "rb") as file:
+        if file.read(len(trace_file_magic)) != trace_file_magic:
+            raise ValueError(f"{path} is not an execution trace")
+        header_length = struct.unpack("<Q", file.read(8))[0]
+        header = json.loads(file.read(header_length))
+
+    offset = len(trace_file_magic) + 8 + header_length
+    records = np.fromfile(path, dtype=trace_record_dtype, offset=offset)
+    return ExecutionTrace(header["process_ids"], records)
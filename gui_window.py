@@ -7,12 +7,14 @@ from PyQt5.QtCore import Qt, QObject
 import math
 import copy
 import time
-import csv
 import os
 import sys
 from distibuted_system import DistributedSystem, DistributedSystemBuilder
-from distributed_objects.qmessage import MessageInfoDelayChannel, MessageInfo, QMessage
+from distributed_objects.qmessage import MessageInfoDelayChannel, MessageInfoFifoChannel, MessageInfo, QMessage
 from distributed_objects.process import ExampleEchoProcess
+from distributed_objects.channel import AbstractChannel
+from distributed_objects.faulty_channel import FaultyChannel
+from configuration_objects.topology_loader import TopologyFormat, load_topology
 
 
 class Window(QMainWindow):
@@ -85,16 +87,26 @@ class Window(QMainWindow):
         qmessage.set_graph(self.vertexes)
         self.add_message(qmessage)
 
-    def create_new_delay_channel(self, sender_id, receiver_id, delay_range) -> MessageInfoDelayChannel:
-        channel = MessageInfoDelayChannel(
+    def create_new_delay_channel(self, sender_id, receiver_id, delay_range) -> AbstractChannel:
+        channel_type = MessageInfoFifoChannel if self.fifo_channel_type.isChecked() else MessageInfoDelayChannel
+        channel = channel_type(
             sender_id,
             receiver_id,
             delay_range,
             self.get_message_callback
         )
 
+        delivery_chance = self.get_delivery_chance()
+        if delivery_chance < 1:
+            return FaultyChannel(channel, drop_probability=1 - delivery_chance)
         return channel
 
+    def get_delivery_chance(self) -> float:
+        try:
+            return min(1.0, max(0.0, float(self.delivery_chance.text())))
+        except ValueError:
+            return 1.0
+
     def get_message_callback(self, message_info: MessageInfo):
         self.message_info_signal.signal.emit(message_info)
 
@@ -103,43 +115,17 @@ class Window(QMainWindow):
 
         filename, second = QFileDialog.getOpenFileName(self.window, "Open file", "")
 
-        with open(filename, newline='') as csvfile:
-            data_reader = csv.reader(csvfile, delimiter=' ', quotechar='"')
-            data = []
-            for row in data_reader:
-                data.append([int(x) for x in row])
+        topology = load_topology(filename, TopologyFormat.dense_matrix)
 
-        self.graph = data
-        self.processes_size = len(data)
-        self.rotation_degree = 360 / len(data)
+        self.topology = topology
+        self.processes_size = topology.get_processes_count()
+        self.rotation_degree = 360 / self.processes_size
         self.is_graph_uploaded = True
         self.fill_labels()
         self.paint_menu_window()
         self.timer = QTimer()
         self.timer.timeout.connect(self.update)
-        distributed_system_buidler = DistributedSystemBuilder()
-
-        for i in range(len(data)):
-            distributed_system_buidler.add_process(
-                ExampleEchoProcess(i, i == 0)
-            )
-            for j in range(len(data[i])):
-                if i == j:
-                    continue
-                if data[i][j] == 1:
-                    distributed_system_buidler.add_channel(
-                        self.create_new_delay_channel(
-                            i,
-                            j,
-                            [4, 5]
-                        ),
-                        i,
-                        j
-                    )
-
-        distributed_system_buidler.check()
-
-        self.distributed_system = distributed_system_buidler.build()
+        self.build_distributed_system()
 
         self.timer.start(1000)
 
@@ -161,6 +147,28 @@ class Window(QMainWindow):
 
         # self.paint_message_traversal(message_delay, 1, 2)
 
+    def build_distributed_system(self):
+        distributed_system_buidler = DistributedSystemBuilder()
+
+        distributed_system_buidler.add_topology(
+            self.topology,
+            lambda process_id: ExampleEchoProcess(process_id, process_id == 0),
+            lambda sender_id, receiver_id: self.create_new_delay_channel(
+                sender_id,
+                receiver_id,
+                [4, 5]
+            )
+        )
+
+        distributed_system_buidler.check()
+
+        self.distributed_system = distributed_system_buidler.build()
+
+    def on_channel_type_changed(self):
+        # channels are created by the builder, so the system is rebuilt until it's started
+        if self.distributed_system is not None and not self.distributed_system.has_started:
+            self.build_distributed_system()
+
     def show(self):
         super().show()
         self.window.show()
@@ -224,7 +232,7 @@ class Window(QMainWindow):
         self.delivery_chance.resize(280, 40)
         self.delivery_chance.setFont(QFont("Arial", 16))
         self.delivery_chance.setText("1")
-        self.delivery_chance.setReadOnly(True)
+        self.delivery_chance.editingFinished.connect(self.on_channel_type_changed)
 
         self.select_channel_type = QLabel('Select communication channel type')
         self.select_channel_type.setFont(QFont("Arial", 16))
@@ -238,6 +246,7 @@ class Window(QMainWindow):
         self.regular_channel_type.setText("Regular")
         self.regular_channel_type.setFont(QFont("Arial", 16))
         self.regular_channel_type.setChecked(True)
+        self.fifo_channel_type.toggled.connect(self.on_channel_type_changed)
 
         self.select_initiator = QLabel('Select algorithm initiator')
         self.select_initiator.setFont(QFont("Arial", 16))
@@ -245,7 +254,7 @@ class Window(QMainWindow):
         self.select_initiator.setStyleSheet("color: Blue;")
 
         self.initiator_selected = QComboBox()
-        for i in range(len(self.graph)):
+        for i in range(self.processes_size):
             self.initiator_selected.addItem('Node ' + str(i))
         self.initiator_selected.setFont(QFont("Arial", 16))
 
@@ -291,8 +300,8 @@ class Window(QMainWindow):
     def fill_labels(self):
         self.vertexes = []
         self.labels = []
-        for i in range(len(self.graph)):
-            angle = i * 2 * math.pi / len(self.graph)
+        for i in range(self.processes_size):
+            angle = i * 2 * math.pi / self.processes_size
             x = self.center.x() + int(self.radius * math.cos(angle))
             y = self.center.y() + int(self.radius * math.sin(angle))
             vertex = QPoint(x, y)
@@ -314,7 +323,15 @@ class Window(QMainWindow):
             self.distributed_system.start()
 
     def get_execution(self):
-        pass
+        if self.distributed_system is None:
+            return
+        trace_recorder = self.distributed_system.stop_trace()
+        if trace_recorder is None:
+            self.distributed_system.start_trace("execution.trace")
+            self.execution.setText("Stop recording")
+        else:
+            print(f"Execution recorded to {trace_recorder.path}, lost records: {trace_recorder.lost_records_count}")
+            self.execution.setText("Get execution")
 
     def paint_graph(self, painter):
         for vertex in self.vertexes:
@@ -322,12 +339,10 @@ class Window(QMainWindow):
 
         self.lines = []
 
-        for i in range(len(self.graph)):
-            for j in range(len(self.graph[i])):
-                if self.graph[i][j] == 1 and i != j:
-                    l = QLine(self.vertexes[i], self.vertexes[j])
-                    self.lines.append(l)
-                    painter.drawLine(l)
+        for (i, j) in self.topology.iter_edges():
+            l = QLine(self.vertexes[i], self.vertexes[j])
+            self.lines.append(l)
+            painter.drawLine(l)
 
 
 def application_start():
@@ -0,0 +1,231 @@
+import math
+import time
+from typing import Any, Dict, List, Tuple
+
+from distributed_objects.channel import ChannelWrapper
+
+
+class Histogram:
+    """
+    HDR-style histogram: every power of two above lowest_value is split into sub_buckets_count linear buckets,
+    so recording is a few arithmetic operations and any value is kept with relative error below 1 / sub_buckets_count.
+    Not synchronized, every histogram is expected to be written by one handler at a time
+    """
+
+    def __init__(self, lowest_value=1e-6, sub_buckets_count=32):
+        self.lowest_value = lowest_value
+        self.sub_buckets_count = sub_buckets_count
+        self.counts: List[int] = [0]
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def record(self, value):
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+        index = self.__get_bucket_index__(value)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+
+    def merge(self, other):
+        """
+        adds values recorded by other histogram with the same buckets, e.g. to get latency of all the channels
+        """
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        other_counts = list(other.counts)
+        if len(other_counts) > len(self.counts):
+            self.counts.extend([0] * (len(other_counts) - len(self.counts)))
+        for (index, bucket_count) in enumerate(other_counts):
+            self.counts[index] += bucket_count
+
+    def get_mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def get_percentile(self, percentile) -> float:
+        """
+        :param percentile: from 0 to 100
+        :return: upper bound of the bucket holding the percentile, never above the recorded maximum
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(1, math.ceil(self.count * percentile / 100))
+        seen_count = 0
+        for (index, bucket_count) in enumerate(list(self.counts)):
+            seen_count += bucket_count
+            if seen_count >= rank:
+                return min(self.__get_bucket_upper_bound__(index), self.max)
+        return self.max
+
+    def get_summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "min": self.min if self.count else 0.0,
+            "mean": self.get_mean(),
+            "p50": self.get_percentile(50),
+            "p90": self.get_percentile(90),
+            "p99": self.get_percentile(99),
+            "p999": self.get_percentile(99.9),
+            "max": self.max if self.count else 0.0
+        }
+
+    def __get_bucket_index__(self, value) -> int:
+        scaled_value = value / self.lowest_value
+        if scaled_value < 1:
+            return 0
+        # mantissa is in [0.5, 1)
+        mantissa, exponent = math.frexp(scaled_value)
+        return 1 + (exponent - 1) * self.sub_buckets_count + int((mantissa * 2 - 1) * self.sub_buckets_count)
+
+    def __get_bucket_upper_bound__(self, index) -> float:
+        if index == 0:
+            return self.lowest_value
+        exponent, sub_bucket = divmod(index - 1, self.sub_buckets_count)
+        return self.lowest_value * 2 ** exponent * (1 + (sub_bucket + 1) / self.sub_buckets_count)
+
+
+class HandlerMetrics:
+    """
+    Filled by TaskHandler: how late delayed tasks are performed compared with their end time,
+    how many tasks were queued when the handler took the next batch and how much of the time it was busy
+    """
+
+    def __init__(self):
+        self.timer_lateness = Histogram()
+        self.queue_depth = Histogram(lowest_value=1, sub_buckets_count=8)
+        self.performed_tasks_count = 0
+        self.busy_time = 0.0
+        self.created_at = time.perf_counter()
+
+    def get_utilisation(self) -> float:
+        """
+        share of the real time since metrics were enabled spent in handler's actions,
+        close to 1 means the handler can't keep up
+        """
+        elapsed_time = time.perf_counter() - self.created_at
+        return min(1.0, self.busy_time / elapsed_time) if elapsed_time > 0 else 0.0
+
+    def get_summary(self):
+        return {
+            "performed_tasks": self.performed_tasks_count,
+            "utilisation": self.get_utilisation(),
+            "timer_lateness": self.timer_lateness.get_summary(),
+            "queue_depth": self.queue_depth.get_summary()
+        }
+
+
+class ChannelMetrics:
+    """
+    Counters are updated by the sender's handler, delivered messages and latency by the channel's handler
+    """
+
+    def __init__(self, sender_id, receiver_id):
+        self.sender_id = sender_id
+        self.receiver_id = receiver_id
+        self.sent_count = 0
+        self.delivered_count = 0
+        self.dropped_count = 0
+        # time from handing message to the channel until it's put to the receiver's mailbox
+        self.latency = Histogram()
+
+    def get_in_flight_count(self) -> int:
+        return max(0, self.sent_count - self.delivered_count - self.dropped_count)
+
+    def get_summary(self):
+        return {
+            "sent": self.sent_count,
+            "delivered": self.delivered_count,
+            "dropped": self.dropped_count,
+            "in_flight": self.get_in_flight_count(),
+            "latency": self.latency.get_summary()
+        }
+
+
+class MeteredChannel(ChannelWrapper):
+    """
+    Put in the routing table instead of the channel while metrics are enabled,
+    the channel itself only reports dropped messages
+    """
+
+    def __init__(self, channel, channel_metrics: ChannelMetrics, time_source):
+        super().__init__(channel, channel_metrics.sender_id, channel_metrics.receiver_id)
+        self.channel_metrics = channel_metrics
+        self.time_source = time_source
+        channel.set_channel_metrics(channel_metrics)
+
+    def deliver_message(self, send_message_callback, message):
+        self.channel_metrics.sent_count += 1
+        return self.inner_channel.deliver_message(
+            MeteredChannel.DeliveryCallback(self.channel_metrics, send_message_callback, self.time_source),
+            message
+        )
+
+    class DeliveryCallback:
+        __slots__ = ("channel_metrics", "send_message_callback", "time_source", "sent_at")
+
+        def __init__(self, channel_metrics, send_message_callback, time_source):
+            self.channel_metrics = channel_metrics
+            self.send_message_callback = send_message_callback
+            self.time_source = time_source
+            self.sent_at = time_source()
+
+        def __call__(self, message):
+            channel_metrics = self.channel_metrics
+            channel_metrics.delivered_count += 1
+            channel_metrics.latency.record(self.time_source() - self.sent_at)
+            return self.send_message_callback(message)
+
+
+class MetricsRegistry:
+    """
+    All the metrics of one distributed system, can be read from any thread while the system runs,
+    values read during the run may be behind by the tasks being performed at that moment
+    """
+
+    def __init__(self):
+        # handler name -> its metrics, e.g. "process 1" or "channel 1->2"
+        self.handler_metrics: Dict[str, HandlerMetrics] = {}
+        self.channel_metrics: Dict[Tuple[Any, Any], ChannelMetrics] = {}
+        # process id -> handler whose queued tasks are the process's mailbox
+        self.process_handlers: Dict[Any, Any] = {}
+
+    def create_handler_metrics(self, name) -> HandlerMetrics:
+        handler_metrics = HandlerMetrics()
+        self.handler_metrics[name] = handler_metrics
+        return handler_metrics
+
+    def create_channel_metrics(self, sender_id, receiver_id) -> ChannelMetrics:
+        channel_metrics = ChannelMetrics(sender_id, receiver_id)
+        self.channel_metrics[(sender_id, receiver_id)] = channel_metrics
+        return channel_metrics
+
+    def get_mailbox_depth(self, process_id) -> int:
+        task_handler = self.process_handlers.get(process_id)
+        return 0 if task_handler is None else task_handler.get_queued_tasks_count()
+
+    def get_report(self):
+        """
+        :return: plain dictionaries, ready to be printed or dumped to json
+        """
+        return {
+            "handlers": {
+                name: handler_metrics.get_summary() for (name, handler_metrics) in list(self.handler_metrics.items())
+            },
+            "channels": {
+                f"{sender_id}->{receiver_id}": channel_metrics.get_summary()
+                for ((sender_id, receiver_id), channel_metrics) in list(self.channel_metrics.items())
+            },
+            "mailboxes": {
+                str(process_id): self.get_mailbox_depth(process_id) for process_id in list(self.process_handlers)
+            }
+        }
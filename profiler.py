@@ -0,0 +1,146 @@
+import marshal
+import time
+from threading import local
+from typing import Callable, Dict, Tuple
+
+from distributed_objects.channel import ChannelWrapper
+
+
+class ProfileEntry:
+    """
+    Measured calls of one function of one component, own time excludes the profiled calls made inside
+    """
+
+    def __init__(self):
+        # all the calls, measured or not, so every function is sampled evenly
+        self.seen_calls_count = 0
+        self.calls_count = 0
+        self.cpu_time = 0.0
+        self.own_cpu_time = 0.0
+        # caller key -> [calls count, own cpu time, cpu time]
+        self.callers: Dict[Tuple[str, str], list] = {}
+
+    def record(self, cpu_time, own_cpu_time, caller_key):
+        self.calls_count += 1
+        self.cpu_time += cpu_time
+        self.own_cpu_time += own_cpu_time
+        if caller_key is not None:
+            caller = self.callers.get(caller_key)
+            if caller is None:
+                caller = self.callers.setdefault(caller_key, [0, 0.0, 0.0])
+            caller[0] += 1
+            caller[1] += own_cpu_time
+            caller[2] += cpu_time
+
+
+class Profiler:
+    """
+    CPU time and calls of processes' _on_receive_message_ per message type, channels' deliver_message
+    and every task performed by the handlers, keyed by (component, function).
+    With sampling_interval n only every n-th call of each function is measured and it's counted as n calls.
+    Hooks only check whether a profiler is set, so they cost nothing without it
+    """
+
+    def __init__(self, sampling_interval=1):
+        self.sampling_interval = sampling_interval
+        self.is_enabled = True
+        self.entries: Dict[Tuple[str, str], ProfileEntry] = {}
+        # per thread stack of [key, cpu time of nested profiled calls]
+        self.frames = local()
+
+    def measure(self, component, function, action, *args):
+        """
+        calls action with args on the current thread and records its cpu time,
+        only the synchronous part of async actions is measured
+        """
+        key = (component, function)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries.setdefault(key, ProfileEntry())
+        entry.seen_calls_count += 1
+        if self.sampling_interval > 1 and entry.seen_calls_count % self.sampling_interval:
+            return action(*args)
+
+        stack = getattr(self.frames, "stack", None)
+        if stack is None:
+            stack = self.frames.stack = []
+        caller_key = stack[-1][0] if stack else None
+        frame = [key, 0.0]
+        stack.append(frame)
+        started_at = time.thread_time()
+        try:
+            return action(*args)
+        finally:
+            cpu_time = time.thread_time() - started_at
+            stack.pop()
+            if stack:
+                stack[-1][1] += cpu_time
+            entry.record(cpu_time, cpu_time - frame[1], caller_key)
+
+    def get_report(self):
+        """
+        :return: component -> function -> calls and cpu times, estimated from the samples
+        """
+        scale = self.sampling_interval
+        report = {}
+        for ((component, function), entry) in list(self.entries.items()):
+            report.setdefault(component, {})[function] = {
+                "calls": entry.calls_count * scale,
+                "cpu_time": entry.cpu_time * scale,
+                "own_cpu_time": entry.own_cpu_time * scale
+            }
+        return report
+
+    def dump_stats(self, path):
+        """
+        writes the profile in the format of cProfile's dump_stats, so it can be opened by pstats or snakeviz,
+        component is written in place of the file name
+        """
+        scale = self.sampling_interval
+
+        def to_function(key):
+            component, function = key
+            return str(component), 0, function
+
+        stats = {}
+        for (key, entry) in list(self.entries.items()):
+            callers = {
+                to_function(caller_key): (
+                    calls_count * scale, calls_count * scale, own_cpu_time * scale, cpu_time * scale
+                )
+                for (caller_key, (calls_count, own_cpu_time, cpu_time)) in list(entry.callers.items())
+            }
+            stats[to_function(key)] = (
+                entry.calls_count * scale,
+                entry.calls_count * scale,
+                entry.own_cpu_time * scale,
+                entry.cpu_time * scale,
+                callers
+            )
+        with open(path, "wb") as file:
+            marshal.dump(stats, file)
+
+
+class ProfiledChannel(ChannelWrapper):
+    """
+    Put in the routing table instead of the channel while profiling, measures deliver_message on the sender's side,
+    delivery tasks themselves are measured by the channel's handler.
+    The profiler is asked for on every delivery, so a profiling session started later is measured as well
+    """
+
+    def __init__(self, channel, get_profiler: Callable[[], Profiler | None], sender_id, receiver_id):
+        super().__init__(channel, sender_id, receiver_id)
+        self.get_profiler = get_profiler
+        self.component = f"channel {sender_id}->{receiver_id}"
+
+    def deliver_message(self, send_message_callback, message):
+        profiler = self.get_profiler()
+        if profiler is not None and profiler.is_enabled:
+            return profiler.measure(
+                self.component,
+                "deliver_message",
+                self.inner_channel.deliver_message,
+                send_message_callback,
+                message
+            )
+        return self.inner_channel.deliver_message(send_message_callback, message)
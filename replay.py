@@ -0,0 +1,76 @@
+from typing import Any, Dict, List, Tuple
+
+from distributed_objects.channel import AbstractChannel
+from execution_trace import ExecutionTrace, TraceEvent
+
+
+class ReplaySchedule:
+    """
+    Recorded delivery order: for every delivery the channel and the number of the message in that channel,
+    counted in the order messages were handed to the channel
+    """
+
+    def __init__(self, deliveries: List[Tuple[Any, Any, int]]):
+        self.deliveries = deliveries
+        # (sender, receiver) -> message number -> how many times it was delivered, more than once if duplicated
+        self.deliveries_counts: Dict[Tuple[Any, Any], Dict[int, int]] = {}
+        for (sender_id, receiver_id, message_number) in deliveries:
+            channel_counts = self.deliveries_counts.setdefault((sender_id, receiver_id), {})
+            channel_counts[message_number] = channel_counts.get(message_number, 0) + 1
+
+    def get_deliveries_counts(self, sender_id, receiver_id) -> Dict[int, int]:
+        return dict(self.deliveries_counts.get((sender_id, receiver_id), {}))
+
+    @staticmethod
+    def from_trace(trace: ExecutionTrace):
+        """
+        delivery records carry the number of the message in its channel, dropped messages just never show up
+        """
+        records = trace.records
+        records = records[records["event"] == TraceEvent.delivery]
+        deliveries = [
+            (trace.get_process_id(sender), trace.get_process_id(receiver), message_number)
+            for (sender, receiver, message_number) in zip(
+                records["sender"].tolist(),
+                records["receiver"].tolist(),
+                records["message_id"].tolist())
+        ]
+        return ReplaySchedule(deliveries)
+
+
+class ReplayChannel(AbstractChannel):
+    """
+    Keeps messages without any delay until replay delivers them in the recorded order,
+    a message is kept until it's delivered as many times as it was recorded
+    """
+
+    def __init__(self, deliveries_counts: Dict[int, int] | None = None):
+        """
+        :param deliveries_counts: message number -> recorded deliveries, one for the messages not listed
+        """
+        super().__init__()
+        self.enqueued_count = 0
+        # message number in the channel -> (callback, message)
+        self.messages: Dict[int, Tuple] = {}
+        self.deliveries_counts: Dict[int, int] = deliveries_counts if deliveries_counts is not None else {}
+
+    def deliver_message(self, send_message_callback, message):
+        self.messages[self.enqueued_count] = (send_message_callback, message)
+        self.enqueued_count += 1
+        return None
+
+    def deliver_recorded(self, ordinal) -> bool:
+        """
+        :return: False if the message with this number hasn't been sent, so the run diverged from the recording
+        """
+        entry = self.messages.get(ordinal)
+        if entry is None:
+            return False
+        deliveries_left = self.deliveries_counts.pop(ordinal, 1) - 1
+        if deliveries_left > 0:
+            self.deliveries_counts[ordinal] = deliveries_left
+        else:
+            del self.messages[ordinal]
+        send_message_callback, message = entry
+        send_message_callback(message)
+        return True
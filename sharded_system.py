@@ -0,0 +1,189 @@
+import multiprocessing
+from threading import Thread
+from typing import Callable, Dict, Any, List
+
+from distibuted_system import DistributedSystem, DistributedSystemBuilder
+from distributed_objects.channel import AbstractChannel
+from distributed_objects.process import AbstractProcess
+
+
+class ShardCommand:
+    start = "start"
+    pause = "pause"
+    unpause = "unpause"
+    snapshot = "snapshot"
+    stop = "stop"
+
+
+class ShardedDistributedSystem:
+    """
+    Runs one distributed system on several OS processes (shards), so it isn't limited by the GIL.
+    Processes are spread across the shards, every shard builds its part of the system itself,
+    that's why factories have to be picklable (module level functions) when spawn start method is used.
+    A channel lives in the shard of its sender. Messages to a process of the same shard stay in memory,
+    messages to other shards travel through multiprocessing queues, so they have to be picklable as well.
+    ALL THE USER FUNCTIONS ARE MAIN THREAD ONLY
+    """
+
+    def __init__(self,
+                 graph: Dict[Any, List],
+                 process_factory: Callable[[Any], AbstractProcess],
+                 channel_factory: Callable[[Any, Any], AbstractChannel],
+                 shards_count=None,
+                 executor_factory: Callable | None = None,
+                 start_method=None):
+        """
+        :param graph: receivers ids for every sender id
+        :param process_factory: creates process with given id
+        :param channel_factory: creates channel for given sender and receiver ids
+        :param shards_count: amount of OS processes, cpu count by default
+        :param executor_factory: creates TaskExecutor for every shard, ThreadPerHandlerExecutor is used by default
+        """
+        self.context = multiprocessing.get_context(start_method)
+        self.shards_count = shards_count or multiprocessing.cpu_count()
+        process_ids = list(dict.fromkeys(
+            [sender_id for sender_id in graph] +
+            [receiver_id for receivers_ids in graph.values() for receiver_id in receivers_ids]
+        ))
+        self.shard_of_process: Dict[Any, int] = {
+            process_id: index % self.shards_count for (index, process_id) in enumerate(process_ids)
+        }
+        self.message_queues = [self.context.Queue() for _ in range(self.shards_count)]
+        self.command_queues = [self.context.Queue() for _ in range(self.shards_count)]
+        self.result_queue = self.context.Queue()
+        self.shards = [
+            self.context.Process(
+                target=run_shard,
+                args=(
+                    shard_index,
+                    graph,
+                    self.shard_of_process,
+                    process_factory,
+                    channel_factory,
+                    executor_factory,
+                    self.message_queues,
+                    self.command_queues[shard_index],
+                    self.result_queue
+                ),
+                daemon=True
+            )
+            for shard_index in range(self.shards_count)
+        ]
+        self.has_started = False
+        self.has_stopped = False
+
+    def start(self):
+        if self.has_started:
+            return
+        self.has_started = True
+        for shard in self.shards:
+            shard.start()
+        self.__run_on_all_shards__(ShardCommand.start)
+
+    def pause(self):
+        self.__run_on_all_shards__(ShardCommand.pause)
+
+    def unpause(self):
+        self.__run_on_all_shards__(ShardCommand.unpause)
+
+    def stop(self, is_instant=False):
+        if not self.has_started or self.has_stopped:
+            return
+        self.has_stopped = True
+        self.__run_on_all_shards__(ShardCommand.stop, is_instant)
+        for shard in self.shards:
+            shard.join()
+
+    def get_snapshot(self):
+        """
+        all the shards are paused before any of them is read, so the states are taken at the same moment
+        """
+        self.pause()
+        shard_snapshots = self.__run_on_all_shards__(ShardCommand.snapshot)
+        self.unpause()
+
+        process_information = []
+        channels_information = []
+        for (shard_process_information, shard_channels_information) in shard_snapshots:
+            process_information += shard_process_information
+            channels_information += shard_channels_information
+        return process_information, channels_information
+
+    def __run_on_all_shards__(self, command, argument=None) -> List:
+        """
+        sends command to every shard and waits until all of them have executed it
+        :return: results ordered by shard index
+        """
+        for command_queue in self.command_queues:
+            command_queue.put((command, argument))
+        results = [None] * self.shards_count
+        for _ in range(self.shards_count):
+            shard_index, result = self.result_queue.get()
+            results[shard_index] = result
+        return results
+
+
+def run_shard(shard_index,
+              graph,
+              shard_of_process,
+              process_factory,
+              channel_factory,
+              executor_factory,
+              message_queues,
+              command_queue,
+              result_queue):
+    builder = DistributedSystemBuilder()
+    if executor_factory is not None:
+        builder.set_task_executor(executor_factory())
+    for (process_id, process_shard_index) in shard_of_process.items():
+        if process_shard_index == shard_index:
+            builder.add_process(process_factory(process_id))
+    for (sender_id, receivers_ids) in graph.items():
+        if shard_of_process[sender_id] != shard_index:
+            continue
+        for receiver_id in receivers_ids:
+            builder.add_channel(channel_factory(sender_id, receiver_id), sender_id, receiver_id)
+    distributed_system = builder.build()
+
+    def deliver_to_other_shard(sender_id, receiver_id, message):
+        message_queues[shard_of_process[receiver_id]].put((sender_id, receiver_id, message))
+
+    distributed_system.set_remote_delivery(deliver_to_other_shard)
+
+    receiver_thread = Thread(
+        target=receive_from_other_shards,
+        args=(distributed_system, message_queues[shard_index]),
+        daemon=True
+    )
+    receiver_thread.start()
+
+    while True:
+        command, argument = command_queue.get()
+        result = None
+        if command == ShardCommand.start:
+            distributed_system.start()
+        elif command == ShardCommand.pause:
+            distributed_system.pause()
+        elif command == ShardCommand.unpause:
+            distributed_system.unpause()
+        elif command == ShardCommand.snapshot:
+            result = (
+                [proc.get_current_state_information() for proc in
+                 distributed_system.communication_helper.get_all_processes()],
+                [channel.get_current_state_information() for channel in
+                 distributed_system.communication_helper.get_all_channels()]
+            )
+        elif command == ShardCommand.stop:
+            distributed_system.stop(argument)
+        result_queue.put((shard_index, result))
+        if command == ShardCommand.stop:
+            return
+
+
+def receive_from_other_shards(distributed_system: DistributedSystem, message_queue):
+    while True:
+        sender_id, receiver_id, message = message_queue.get()
+        process = distributed_system.communication_helper.get_process_with_id(receiver_id)
+        if process is not None:
+            # through receive_message_from, so the message gets to the receiver's mailbox, trace and snapshot
+            process.receive_message_from(sender_id, message)
@@ -0,0 +1,340 @@
+import asyncio
+import heapq
+import inspect
+import math
+import os
+import traceback
+from collections import deque
+from itertools import count
+from threading import Thread, Lock, Condition, Event, get_ident
+from time import time
+
+
+class TaskExecutor:
+    """
+    Decides on which threads TaskHandler's tasks are performed.
+    Tasks of one handler are always performed serially, one after another.
+    """
+
+    def start_handler(self, task_handler):
+        pass
+
+    def notify_handler(self, task_handler):
+        """
+        called when handler got new tasks, was paused, unpaused or stopped
+        """
+        pass
+
+    def wait_handler(self, task_handler):
+        pass
+
+    def now(self) -> float:
+        """
+        time source for handler's delays
+        """
+        return time()
+
+
+class ThreadPerHandlerExecutor(TaskExecutor):
+    """
+    Every handler gets its own thread which sleeps on handler's condition
+    """
+
+    def start_handler(self, task_handler):
+        task_handler.thread = Thread(target=task_handler.__start_action__, name=task_handler.name)
+        task_handler.thread.start()
+
+    def notify_handler(self, task_handler):
+        task_handler.__wake_up__()
+
+    def wait_handler(self, task_handler):
+        if task_handler.thread is not None:
+            task_handler.thread.join()
+
+
+default_task_executor = ThreadPerHandlerExecutor()
+
+
+class WorkerPoolExecutor(TaskExecutor):
+    """
+    Multiplexes any number of handlers onto a fixed amount of worker threads.
+    A handler is queued at most once, so its tasks are never performed concurrently.
+    Delayed tasks are waited for by the workers themselves using one heap of handler wake up times.
+    """
+
+    idle_state = 0
+    queued_state = 1
+    running_state = 2
+    # handler got notified while running and has to be queued again
+    running_notified_state = 3
+
+    def __init__(self, workers_count=None, name="WorkerPool"):
+        self.name = name
+        self.workers_count = workers_count or os.cpu_count() or 4
+        self.condition = Condition(Lock())
+        self.ready_handlers = deque()
+        # min-heap of (wake up time, insertion order, handler)
+        self.timers = []
+        self.timers_counter = count()
+        self.handler_states = {}
+        self.finished_events = {}
+        self.workers = []
+        self.is_shut_down = False
+
+    def start_handler(self, task_handler):
+        with self.condition:
+            if not self.workers:
+                self.__start_workers__()
+            self.finished_events[task_handler] = Event()
+            self.handler_states[task_handler] = WorkerPoolExecutor.queued_state
+            self.ready_handlers.append(task_handler)
+            self.condition.notify()
+
+    def notify_handler(self, task_handler):
+        with self.condition:
+            state = self.handler_states.get(task_handler)
+            if state == WorkerPoolExecutor.idle_state:
+                self.handler_states[task_handler] = WorkerPoolExecutor.queued_state
+                self.ready_handlers.append(task_handler)
+                self.condition.notify()
+            elif state == WorkerPoolExecutor.running_state:
+                self.handler_states[task_handler] = WorkerPoolExecutor.running_notified_state
+
+    def wait_handler(self, task_handler):
+        finished_event = self.finished_events.get(task_handler)
+        if finished_event is not None:
+            finished_event.wait()
+
+    def shutdown(self):
+        with self.condition:
+            self.is_shut_down = True
+            self.condition.notify_all()
+
+    def __start_workers__(self):
+        for i in range(self.workers_count):
+            worker = Thread(target=self.__worker_loop__, name=f"{self.name}-{i}", daemon=True)
+            self.workers.append(worker)
+            worker.start()
+
+    def __worker_loop__(self):
+        while True:
+            with self.condition:
+                while True:
+                    self.__release_due_timers__(self.now())
+                    if self.ready_handlers:
+                        task_handler = self.ready_handlers.popleft()
+                        self.handler_states[task_handler] = WorkerPoolExecutor.running_state
+                        break
+                    if self.is_shut_down:
+                        return
+                    self.condition.wait(self.__get_timers_timeout__(self.now()))
+
+            self.__run_handler__(task_handler)
+
+    def __run_handler__(self, task_handler) -> int:
+        """
+        :return: amount of tasks handler got to perform
+        """
+        ready_tasks = []
+        try:
+            ready_tasks, _ = task_handler.__take_ready_tasks__()
+            task_handler.__perform_tasks__(ready_tasks)
+        except Exception:
+            traceback.print_exc()
+        wait_timeout = task_handler.__get_wait_timeout_or_finish__()
+
+        with self.condition:
+            if wait_timeout == task_handler.finished_timeout:
+                self.handler_states.pop(task_handler, None)
+                self.finished_events.pop(task_handler).set()
+                return len(ready_tasks)
+
+            if wait_timeout == 0 or self.handler_states[task_handler] == WorkerPoolExecutor.running_notified_state:
+                self.handler_states[task_handler] = WorkerPoolExecutor.queued_state
+                self.ready_handlers.append(task_handler)
+                self.condition.notify()
+                return len(ready_tasks)
+
+            self.handler_states[task_handler] = WorkerPoolExecutor.idle_state
+            if wait_timeout is not None:
+                self.__push_timer__(task_handler, wait_timeout)
+                self.condition.notify()
+        return len(ready_tasks)
+
+    def __push_timer__(self, task_handler, wait_timeout):
+        """
+        should be called under condition's lock
+        """
+        current_time = self.now()
+        wake_time = current_time + wait_timeout
+        if wake_time <= current_time:
+            # too small timeout to be added to current time, the clock has to move anyway
+            wake_time = math.nextafter(current_time, math.inf)
+        heapq.heappush(self.timers, (wake_time, next(self.timers_counter), task_handler))
+
+    def __release_due_timers__(self, current_time):
+        """
+        should be called under condition's lock
+        """
+        while self.timers and self.timers[0][0] <= current_time:
+            _, _, task_handler = heapq.heappop(self.timers)
+            if self.handler_states.get(task_handler) == WorkerPoolExecutor.idle_state:
+                self.handler_states[task_handler] = WorkerPoolExecutor.queued_state
+                self.ready_handlers.append(task_handler)
+
+    def __get_timers_timeout__(self, current_time):
+        if not self.timers:
+            return None
+        return max(0.0, self.timers[0][0] - current_time)
+
+
+class VirtualTimeExecutor(WorkerPoolExecutor):
+    """
+    Discrete-event simulation: all handlers share one queue ordered by simulated time.
+    Nothing is performed until run is called, then the clock jumps straight to the next event,
+    so delays cost no real time. Everything is performed on the thread which called run.
+    """
+
+    def __init__(self, start_time=0.0):
+        super().__init__(None, "VirtualTime")
+        self.workers_count = 0
+        self.current_time = start_time
+
+    def now(self) -> float:
+        return self.current_time
+
+    def start_handler(self, task_handler):
+        with self.condition:
+            self.finished_events[task_handler] = Event()
+            self.handler_states[task_handler] = WorkerPoolExecutor.queued_state
+            self.ready_handlers.append(task_handler)
+
+    def wait_handler(self, task_handler):
+        """
+        keeps simulating until the handler is finished or there is nothing left to simulate
+        """
+        while task_handler in self.finished_events:
+            if self.__step__(None) is None:
+                return
+
+    def run(self, until_time=None, max_events=None) -> float:
+        """
+        :param until_time: simulated time to stop at, None to run until there are no events left
+        :param max_events: maximum amount of tasks to perform
+        :return: simulated time at which the run ended
+        """
+        performed_events = 0
+        while max_events is None or performed_events < max_events:
+            performed_tasks = self.__step__(until_time)
+            if performed_tasks is None:
+                break
+            performed_events += performed_tasks
+        return self.current_time
+
+    def __step__(self, until_time) -> int | None:
+        """
+        runs the next ready handler, moving the clock to the next wake up time if nobody is ready
+        :return: amount of performed tasks, None if there is nothing to simulate before until_time
+        """
+        with self.condition:
+            while not self.ready_handlers:
+                if not self.timers:
+                    return None
+                wake_time = self.timers[0][0]
+                if until_time is not None and wake_time > until_time:
+                    self.current_time = max(self.current_time, until_time)
+                    return None
+                self.current_time = max(self.current_time, wake_time)
+                self.__release_due_timers__(self.current_time)
+            task_handler = self.ready_handlers.popleft()
+            self.handler_states[task_handler] = WorkerPoolExecutor.running_state
+
+        return self.__run_handler__(task_handler)
+
+
+class AsyncioExecutor(TaskExecutor):
+    """
+    Runs every handler as a coroutine on one asyncio event loop, so any amount of processes and channels
+    lives in a single thread. Delays are waited with loop.call_later, actions returning coroutines
+    (e.g. async def _on_receive_message_) are awaited before the next task of the same handler.
+    If no loop is given, a new one is run on a background thread started with the first handler.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop | None = None):
+        self.loop = loop if loop else asyncio.new_event_loop()
+        self.owns_loop = loop is None
+        self.loop_thread: Thread | None = None
+        self.loop_thread_id = None
+        self.start_lock = Lock()
+        self.wake_up_events = {}
+        self.finished_events = {}
+
+    def now(self) -> float:
+        return self.loop.time()
+
+    def start_handler(self, task_handler):
+        with self.start_lock:
+            self.finished_events[task_handler] = Event()
+            if self.owns_loop and self.loop_thread is None:
+                self.loop_thread = Thread(target=self.__run_loop__, name="AsyncioExecutor", daemon=True)
+                self.loop_thread.start()
+        self.loop.call_soon_threadsafe(self.__create_driver__, task_handler)
+
+    def notify_handler(self, task_handler):
+        wake_up_event = self.wake_up_events.get(task_handler)
+        if wake_up_event is None:
+            return
+        if get_ident() == self.loop_thread_id:
+            wake_up_event.set()
+        else:
+            self.loop.call_soon_threadsafe(wake_up_event.set)
+
+    def wait_handler(self, task_handler):
+        finished_event = self.finished_events.get(task_handler)
+        if finished_event is not None:
+            finished_event.wait()
+
+    def shutdown(self):
+        if self.owns_loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def __run_loop__(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def __create_driver__(self, task_handler):
+        self.loop_thread_id = get_ident()
+        wake_up_event = asyncio.Event()
+        self.wake_up_events[task_handler] = wake_up_event
+        self.loop.create_task(self.__drive_handler__(task_handler, wake_up_event))
+
+    async def __drive_handler__(self, task_handler, wake_up_event: asyncio.Event):
+        try:
+            while True:
+                wake_up_event.clear()
+                ready_tasks, wait_timeout = task_handler.__take_ready_tasks__()
+                if wait_timeout == task_handler.finished_timeout:
+                    return
+
+                for task_info in ready_tasks:
+                    if not task_info.is_scheduled():
+                        continue
+                    try:
+                        result = task_info.__perform_action__()
+                        if inspect.isawaitable(result):
+                            await result
+                    except Exception:
+                        traceback.print_exc()
+                task_handler.__on_tasks_finished__(len(ready_tasks))
+                if ready_tasks:
+                    # lets other handlers run between the batches
+                    await asyncio.sleep(0)
+                    continue
+
+                timer = self.loop.call_later(wait_timeout, wake_up_event.set) if wait_timeout is not None else None
+                await wake_up_event.wait()
+                if timer is not None:
+                    timer.cancel()
+        finally:
+            self.wake_up_events.pop(task_handler, None)
+            self.finished_events.pop(task_handler).set()
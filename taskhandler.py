@@ -1,8 +1,13 @@
-from threading import Lock
-from time import time
-from typing import Callable, List
+import asyncio
+import heapq
+import inspect
+import time
+from itertools import count
+from threading import Lock, Condition
+from typing import Callable, Dict, List, Tuple
 from dataclasses import dataclass
 from threading import Thread
+from taskexecutor import TaskExecutor, default_task_executor
 
 
 @dataclass
@@ -11,7 +16,49 @@ class Task:
     delay: float | None = None
 
 
+class PausableClock:
+    """
+    Time of the source minus all the time the clock was paused, stands still while paused.
+    Pause and unpause only move the accumulated offset, so tasks' end times never have to be updated.
+    A clock driven by another PausableClock also stands still while that clock is paused,
+    that's how one system-wide clock pauses all the handlers at once.
+    """
+
+    def __init__(self, time_source: Callable[[], float], source_clock=None):
+        self.source_clock: PausableClock | None = source_clock
+        self.time_source: Callable[[], float] = source_clock.now if source_clock else time_source
+        self.lock = Lock()
+        # (source time at which clock was paused or None, accumulated paused time)
+        # replaced as a whole, so readers never see a half updated state
+        self.state: Tuple[float | None, float] = (None, 0.0)
+
+    def now(self) -> float:
+        pause_time, paused_offset = self.state
+        if pause_time is not None:
+            return pause_time - paused_offset
+        return self.time_source() - paused_offset
+
+    def is_paused(self) -> bool:
+        if self.state[0] is not None:
+            return True
+        return self.source_clock is not None and self.source_clock.is_paused()
+
+    def pause(self):
+        with self.lock:
+            pause_time, paused_offset = self.state
+            if pause_time is None:
+                self.state = (self.time_source(), paused_offset)
+
+    def unpause(self):
+        with self.lock:
+            pause_time, paused_offset = self.state
+            if pause_time is not None:
+                self.state = (None, paused_offset + self.time_source() - pause_time)
+
+
 class TaskInfo:
+    __slots__ = ()
+
     def deschedule_task(self):
         pass
 
@@ -32,36 +79,153 @@ class TaskInfo:
 
 
 class TaskHandler:
-    def __init__(self, name=""):
+    # wait timeout reported to the executor when the handler has nothing more to do
+    finished_timeout = -1
+    # queue round of a delayed task taken from the heap
+    taken_round = -1
+
+    def __init__(self, name="", executor: TaskExecutor | None = None):
         self.name = name
+        self.executor: TaskExecutor = executor if executor else default_task_executor
         self.is_instant_stop = False
         self.task_lock = Lock()
+        # the loop sleeps on this condition until new work, the next delay end, pause/unpause or stop
+        self.task_condition = Condition(self.task_lock)
         self.start_lock = Lock()
-        self.pause_lock = Lock()
-        self.pause_time = None
-        self.thread: Thread = Thread(target=self.__start_action__)
+        # delays are measured by this clock, so pausing it pauses them
+        self.clock = PausableClock(self.executor.now)
+        self.thread: Thread | None = None
         self.is_finished = None
         self.pending_instant_tasks: List[TaskHandler.TaskInfoImpl] = []
         self.pending_delayed_tasks: List[TaskHandler.TaskInfoImpl] = []
         self.scheduled_instant_task: List[TaskHandler.TaskInfoImpl] = []
-        self.scheduled_delayed_tasks: List[TaskHandler.TaskInfoImpl] = []
+        # min-heap of (delay end time, insertion order, task info), descheduled tasks are removed lazily
+        self.scheduled_delayed_tasks: List[Tuple[float, int, TaskHandler.TaskInfoImpl]] = []
+        self.delayed_tasks_counter = count()
+        # descheduled tasks still kept in pending_delayed_tasks or scheduled_delayed_tasks
+        self.descheduled_delayed_tasks_count = 0
+        # descheduled tasks still kept in pending_instant_tasks or scheduled_instant_task,
+        # all the instant tasks are taken at once, every time it happens a new round starts
+        self.descheduled_instant_tasks_count = 0
+        self.instant_tasks_round = 1
+        # batch action -> its descheduled items still kept in batches
+        self.descheduled_batch_items_counts: Dict[Callable, int] = {}
+        # items gathered for every batch action, a batch exists only while its task is queued or being performed
+        self.batches: Dict[Callable, List] = {}
+        # metrics.HandlerMetrics while metrics are enabled
+        self.metrics = None
+        # tasks taken from the queues and tasks whose actions have returned, they differ while handler is busy
+        self.taken_tasks_count = 0
+        self.finished_tasks_count = 0
+        # profiler.Profiler while profiling, tasks are recorded under profile_name
+        self.profiler = None
+        self.profile_name = name
+        # called without the lock when performed tasks leave the handler idle, set while somebody waits for it
+        self.on_drained: Callable[[], None] | None = None
+
+    def __now__(self) -> float:
+        """
+        time of handler's executor, real or simulated, without the time handler was paused
+        """
+        return self.clock.now()
+
+    def is_paused(self) -> bool:
+        return self.clock.is_paused()
+
+    def set_executor(self, executor: TaskExecutor):
+        with self.start_lock:
+            if self.is_finished is None:
+                self.executor = executor
+                self.__replace_clock__(PausableClock(executor.now, self.clock.source_clock))
 
-    @staticmethod
-    def __calculate_delay_end_time__(delay):
-        if delay is None:
-            return None
-        current_time_seconds = time()
-        return delay + current_time_seconds
+    def set_source_clock(self, source_clock: PausableClock):
+        """
+        makes the handler stand still whenever source_clock is paused, should be called before start
+        """
+        with self.start_lock:
+            if self.is_finished is None:
+                self.__replace_clock__(PausableClock(self.executor.now, source_clock))
+
+    def __replace_clock__(self, clock: PausableClock):
+        """
+        a pause made before start is kept by the new clock
+        should be called under start_lock
+        """
+        if self.clock.state[0] is not None:
+            clock.pause()
+        self.clock = clock
+
+    def set_metrics(self, metrics):
+        self.metrics = metrics
+
+    def set_profiler(self, profiler, profile_name=None):
+        if profile_name is not None:
+            self.profile_name = profile_name
+        self.profiler = profiler
+
+    def get_queued_tasks_count(self) -> int:
+        """
+        tasks waiting to be performed including the delayed ones, read without the lock so may be slightly off
+        """
+        instant_tasks_count = len(self.pending_instant_tasks) + len(self.scheduled_instant_task)
+        delayed_tasks_count = len(self.pending_delayed_tasks) + len(self.scheduled_delayed_tasks)
+        return (max(0, instant_tasks_count - self.descheduled_instant_tasks_count) +
+                max(0, delayed_tasks_count - self.descheduled_delayed_tasks_count))
+
+    def is_idle(self) -> bool:
+        """
+        nothing is queued and no action is being performed
+        """
+        with self.task_lock:
+            return self.taken_tasks_count == self.finished_tasks_count and self.get_queued_tasks_count() == 0
 
     def wait(self):
-        self.thread.join()
+        self.executor.wait_handler(self)
+
+    def schedule_action(self, action: Callable, delay: float = None, args: tuple = ()) -> TaskInfo:
+        """
+        action is called with args, so callers pass a bound method and its arguments instead of creating a closure
+        :return: the task record itself, costs nothing extra if the caller doesn't need it
+        """
+        task_info = TaskHandler.TaskInfoImpl(self, action, args, delay)
+        if not self.is_finished:
+            with self.task_condition:
+                if delay is None or delay == 0:
+                    task_info.__queue_round__ = self.instant_tasks_round
+                    self.pending_instant_tasks.append(task_info)
+                else:
+                    self.pending_delayed_tasks.append(task_info)
+            self.executor.notify_handler(self)
+        return task_info
 
-    def schedule_action(self, action: Callable, delay: float = None) -> TaskInfo:
-        task = Task(
-            action,
-            delay
-        )
-        return self.schedule_task(task)
+    def schedule_batch_item(self, batch_action: Callable, item) -> TaskInfo:
+        """
+        adds the item to the batch of batch_action, only one instant task per batch action is queued at a time,
+        so batch_action is called once with all the items which came until that task is performed
+        :return: record of the item, descheduling it takes the item out of the batch
+        """
+        batch_item = TaskHandler.BatchItem(self, batch_action, item)
+        if self.is_finished:
+            return batch_item
+        with self.task_condition:
+            batch = self.batches.get(batch_action)
+            if batch is not None:
+                batch.append(batch_item)
+                return batch_item
+            self.batches[batch_action] = [batch_item]
+            task_info = TaskHandler.TaskInfoImpl(self, self.__perform_batch__, (batch_action,), None)
+            task_info.__queue_round__ = self.instant_tasks_round
+            self.pending_instant_tasks.append(task_info)
+        self.executor.notify_handler(self)
+        return batch_item
+
+    def __perform_batch__(self, batch_action: Callable):
+        with self.task_lock:
+            batch = self.batches.pop(batch_action, [])
+            self.descheduled_batch_items_counts.pop(batch_action, None)
+            for batch_item in batch:
+                batch_item.is_taken = True
+        return batch_action([batch_item.item for batch_item in batch if not batch_item.is_descheduled])
 
     def __has_scheduled_or_pending_tasks__(self) -> bool:
         return not (not self.scheduled_instant_task and
@@ -70,102 +234,295 @@ class TaskHandler:
                     not self.pending_delayed_tasks)
 
     def schedule_task(self, task: Task) -> TaskInfo:
-        task_info = TaskHandler.TaskInfoImpl(self, task)
-        if not self.is_finished:
-            with self.task_lock:
-                if task.delay is None or task.delay == 0:
-                    self.pending_instant_tasks.append(task_info)
-                else:
-                    self.pending_delayed_tasks.append(task_info)
-        return task_info
+        return self.schedule_action(task.action, task.delay)
 
     def start(self):
         with self.start_lock:
             if self.is_finished is None:
                 self.is_finished = False
-                self.thread.start()
+                self.executor.start_handler(self)
 
     def pause(self):
-        with self.pause_lock:
-            if self.pause_time is None:
-                self.pause_time = time()
+        self.clock.pause()
+        self.executor.notify_handler(self)
 
     def unpause(self):
-        with self.pause_lock:
-            if self.pause_time is not None:
-                time_diff = time() - self.pause_time
-                with self.task_lock:
-                    for pending_task in self.pending_delayed_tasks:
-                        pending_task.__set_delay_end_time__(pending_task.__get_delay_end_time__() + time_diff)
-                    for scheduled_task in self.scheduled_delayed_tasks:
-                        scheduled_task.__set_delay_end_time__(scheduled_task.__get_delay_end_time__() + time_diff)
-                self.pause_time = None
+        """
+        costs the same no matter how many tasks are scheduled, also wakes the handler up
+        after its source clock was unpaused
+        """
+        self.clock.unpause()
+        self.executor.notify_handler(self)
+
+    def __wake_up__(self):
+        with self.task_condition:
+            self.task_condition.notify()
 
     def __start_action__(self):
-        self.__synchronize_with_pending_tasks__()
-        while (self.__has_scheduled_or_pending_tasks__() or not self.is_finished) \
-                and not self.is_instant_stop:
-            if self.pause_time is not None:
-                continue
-            new_delayed_tasks = []
-            current_time = time()
-
-            for task_info in self.scheduled_delayed_tasks:
-                if not task_info.is_scheduled():
+        while True:
+            with self.task_condition:
+                self.__synchronize_with_pending_tasks__()
+                if self.__should_finish__():
+                    break
+                wait_timeout = self.__get_wait_timeout__(self.__now__())
+                if wait_timeout is None or wait_timeout > 0:
+                    self.task_condition.wait(wait_timeout)
                     continue
+                ready_tasks = self.__pop_ready_tasks__(self.__now__())
 
-                if task_info.__get_delay_end_time__() <= current_time:
-                    task_info.__perform_action__()
-                else:
-                    new_delayed_tasks.append(task_info)
-
-            for task_info in self.scheduled_instant_task:
-                if task_info.is_scheduled():
-                    task_info.__perform_action__()
+            self.__perform_tasks__(ready_tasks)
 
-            self.scheduled_delayed_tasks = new_delayed_tasks
-            self.scheduled_instant_task = []
+    def __take_ready_tasks__(self):
+        """
+        used by executors which don't keep a thread per handler
+        :return: tasks to perform right now and how long to wait for the next ones
+        """
+        with self.task_condition:
             self.__synchronize_with_pending_tasks__()
+            if self.__should_finish__():
+                return [], TaskHandler.finished_timeout
+            wait_timeout = self.__get_wait_timeout__(self.__now__())
+            if wait_timeout == 0:
+                return self.__pop_ready_tasks__(self.__now__()), 0
+            return [], wait_timeout
+
+    def __get_wait_timeout_or_finish__(self) -> float | None:
+        with self.task_condition:
+            self.__synchronize_with_pending_tasks__()
+            if self.__should_finish__():
+                return TaskHandler.finished_timeout
+            return self.__get_wait_timeout__(self.__now__())
+
+    def __perform_tasks__(self, ready_tasks):
+        try:
+            metrics = self.metrics
+            if metrics is not None:
+                started_at = time.perf_counter()
+                self.__perform_ready_tasks__(ready_tasks)
+                metrics.busy_time += time.perf_counter() - started_at
+                metrics.performed_tasks_count += len(ready_tasks)
+            else:
+                self.__perform_ready_tasks__(ready_tasks)
+        finally:
+            self.__on_tasks_finished__(len(ready_tasks))
+
+    def __on_tasks_finished__(self, tasks_count):
+        """
+        should be called by executors performing tasks taken by __take_ready_tasks__ themselves
+        """
+        self.finished_tasks_count += tasks_count
+        on_drained = self.on_drained
+        if on_drained is not None and self.is_idle():
+            on_drained()
+
+    @staticmethod
+    def __perform_ready_tasks__(ready_tasks):
+        for task_info in ready_tasks:
+            if task_info.is_scheduled():
+                result = task_info.__perform_action__()
+                if inspect.iscoroutine(result):
+                    # async actions outside of AsyncioExecutor are run to completion in place
+                    asyncio.run(result)
+
+    def __should_finish__(self) -> bool:
+        """
+        should be called under task_lock
+        """
+        if self.is_instant_stop:
+            return True
+        if not self.is_finished or self.scheduled_instant_task:
+            return False
+        # descheduled tasks left in the heap shouldn't keep a stopped handler alive
+        return not any(task_info.is_scheduled() for (_, _, task_info) in self.scheduled_delayed_tasks)
+
+    def __get_wait_timeout__(self, current_time) -> float | None:
+        """
+        how long the loop may sleep, None means until somebody wakes it up
+        should be called under task_lock
+        """
+        if self.clock.is_paused():
+            return None
+        if self.scheduled_instant_task:
+            return 0
+        if not self.scheduled_delayed_tasks:
+            return None
+        end_time, _, task_info = self.scheduled_delayed_tasks[0]
+        if not task_info.is_scheduled():
+            return 0
+        return max(0.0, end_time - current_time)
+
+    def __pop_ready_tasks__(self, current_time) -> List:
+        """
+        pops only the delayed tasks whose delay has ended followed by instant tasks,
+        descheduled tasks are dropped when they reach the top
+        should be called under task_lock
+        """
+        ready_tasks = []
+        metrics = self.metrics
+        delayed_tasks = self.scheduled_delayed_tasks
+        if metrics is not None:
+            metrics.queue_depth.record(len(delayed_tasks) + len(self.scheduled_instant_task))
+        while delayed_tasks:
+            end_time, _, task_info = delayed_tasks[0]
+            if task_info.is_scheduled() and end_time > current_time:
+                break
+            heapq.heappop(delayed_tasks)
+            task_info.__queue_round__ = TaskHandler.taken_round
+            if task_info.is_scheduled():
+                ready_tasks.append(task_info)
+                if metrics is not None:
+                    metrics.timer_lateness.record(current_time - end_time)
+            else:
+                self.descheduled_delayed_tasks_count = max(0, self.descheduled_delayed_tasks_count - 1)
+
+        ready_tasks += self.scheduled_instant_task
+        self.scheduled_instant_task = []
+        # pending instant tasks were moved to the scheduled ones just before, so no instant task is left
+        self.instant_tasks_round += 1
+        self.descheduled_instant_tasks_count = 0
+        self.taken_tasks_count += len(ready_tasks)
+        return ready_tasks
 
     def __synchronize_with_pending_tasks__(self):
-        with self.task_lock:
+        """
+        should be called under task_lock
+        """
+        if self.pending_instant_tasks or self.pending_delayed_tasks:
             self.scheduled_instant_task += self.pending_instant_tasks
-            self.scheduled_delayed_tasks += self.pending_delayed_tasks
+            for task_info in self.pending_delayed_tasks:
+                if not task_info.is_scheduled():
+                    self.descheduled_delayed_tasks_count -= 1
+                    continue
+                heapq.heappush(
+                    self.scheduled_delayed_tasks,
+                    (task_info.__get_delay_end_time__(), next(self.delayed_tasks_counter), task_info)
+                )
             self.pending_delayed_tasks = []
             self.pending_instant_tasks = []
+        self.__compact_delayed_tasks_if_needed__()
+
+    def __on_task_descheduled__(self, task_info):
+        """
+        tasks already taken from the queues aren't counted, so the counts stay exact
+        """
+        with self.task_lock:
+            if task_info.total_delay:
+                if task_info.__queue_round__ == TaskHandler.taken_round:
+                    return
+                self.descheduled_delayed_tasks_count += 1
+                self.__compact_delayed_tasks_if_needed__()
+            else:
+                if task_info.__queue_round__ != self.instant_tasks_round:
+                    return
+                self.descheduled_instant_tasks_count += 1
+                self.__compact_instant_tasks_if_needed__()
+
+    def __on_batch_item_descheduled__(self, batch_item):
+        with self.task_lock:
+            if batch_item.is_taken:
+                return
+            batch_action = batch_item.batch_action
+            descheduled_count = self.descheduled_batch_items_counts.get(batch_action, 0) + 1
+            batch = self.batches.get(batch_action, ())
+            if descheduled_count * 2 > len(batch):
+                self.batches[batch_action] = [item for item in batch if not item.is_descheduled]
+                descheduled_count = 0
+            self.descheduled_batch_items_counts[batch_action] = descheduled_count
+
+    def __compact_delayed_tasks_if_needed__(self):
+        """
+        rebuilds the heap when descheduled tasks take more than a half of the delayed ones,
+        so lazy removal doesn't leak memory
+        should be called under task_lock
+        """
+        delayed_tasks_count = len(self.scheduled_delayed_tasks) + len(self.pending_delayed_tasks)
+        if self.descheduled_delayed_tasks_count * 2 <= delayed_tasks_count:
+            return
+        self.scheduled_delayed_tasks = [
+            entry for entry in self.scheduled_delayed_tasks if entry[2].is_scheduled()
+        ]
+        heapq.heapify(self.scheduled_delayed_tasks)
+        self.pending_delayed_tasks = [
+            task_info for task_info in self.pending_delayed_tasks if task_info.is_scheduled()
+        ]
+        self.descheduled_delayed_tasks_count = 0
+
+    def __compact_instant_tasks_if_needed__(self):
+        """
+        should be called under task_lock
+        """
+        instant_tasks_count = len(self.scheduled_instant_task) + len(self.pending_instant_tasks)
+        if self.descheduled_instant_tasks_count * 2 <= instant_tasks_count:
+            return
+        self.scheduled_instant_task = [
+            task_info for task_info in self.scheduled_instant_task if task_info.is_scheduled()
+        ]
+        self.pending_instant_tasks = [
+            task_info for task_info in self.pending_instant_tasks if task_info.is_scheduled()
+        ]
+        self.descheduled_instant_tasks_count = 0
 
     def stop(self):
         self.is_finished = True
+        self.executor.notify_handler(self)
 
     def instant_stop(self):
         self.is_instant_stop = True
         self.is_finished = True
+        self.executor.notify_handler(self)
 
     class TaskInfoImpl(TaskInfo):
-        def __init__(self, task_handler, task: Task):
-            self.__inner_task__ = task
+        """
+        Task record kept in handler's queues, without a lock, flags are only set to True
+        """
+        __slots__ = (
+            "__task_handler__",
+            "action",
+            "args",
+            "__delay_end_time__",
+            "total_delay",
+            "__is_done__",
+            "__descheduled__",
+            "__queue_round__"
+        )
+
+        def __init__(self, task_handler, action: Callable, args: tuple, delay: float | None):
             self.__task_handler__ = task_handler
-            self.__delay_end_time__: float | None = TaskHandler.__calculate_delay_end_time__(task.delay)
-            self.__update_time_lock__ = Lock()
-            self.total_delay: float | None = task.delay
+            self.action = action
+            self.args = args
+            self.__delay_end_time__: float | None = None if delay is None else delay + task_handler.__now__()
+            self.total_delay: float | None = delay
             self.__is_done__: bool = False
             self.__descheduled__: bool = False
+            # instant_tasks_round in which an instant task was queued, taken_round once a delayed task is taken
+            self.__queue_round__ = 0
 
         def __get_delay_end_time__(self) -> float:
             return 0 if self.__delay_end_time__ is None else self.__delay_end_time__
 
-        def __set_delay_end_time__(self, new_delay_end_time: float):
-            with self.__update_time_lock__:
-                self.__delay_end_time__ = new_delay_end_time
-
         def __perform_action__(self):
             if self.is_scheduled() and not self.is_done():
                 self.__mark_as_done__()
-                self.__inner_task__.action()
+                action = self.action
+                profiler = self.__task_handler__.profiler
+                if profiler is None:
+                    result = action(*self.args)
+                else:
+                    result = profiler.measure(
+                        self.__task_handler__.profile_name,
+                        getattr(action, "__qualname__", type(action).__name__),
+                        action,
+                        *self.args
+                    )
                 self.deschedule_task()
+                return result
 
         def deschedule_task(self):
+            if self.__descheduled__:
+                return
             self.__descheduled__ = True
+            if not self.__is_done__:
+                self.__task_handler__.__on_task_descheduled__(self)
 
         def is_scheduled(self) -> bool:
             return not self.__descheduled__
@@ -186,14 +543,11 @@ class TaskHandler:
             if self.get_delay() == 0:
                 return 0
 
-            pause_time = self.__task_handler__.pause_time
-
-            if pause_time:
-                time_left = self.__delay_end_time__ - pause_time
-                if time_left >= 0:
-                    return time_left
-                else:
-                    return 0
+            time_left = self.__delay_end_time__ - self.__task_handler__.__now__()
+            if time_left >= 0:
+                return time_left
+            else:
+                return 0
 
         def time_left_relative(self) -> float:
             time_left = self.time_left()
@@ -204,3 +558,37 @@ class TaskHandler:
                 return time_left / self.get_delay()
             else:
                 return 1
+
+    class BatchItem(TaskInfo):
+        """
+        Item waiting in a batch, a descheduled one isn't handed over to the batch action
+        """
+        __slots__ = ("task_handler", "batch_action", "item", "is_taken", "is_descheduled")
+
+        def __init__(self, task_handler, batch_action: Callable, item):
+            self.task_handler = task_handler
+            self.batch_action = batch_action
+            self.item = item
+            self.is_taken = False
+            self.is_descheduled = False
+
+        def deschedule_task(self):
+            if self.is_descheduled:
+                return
+            self.is_descheduled = True
+            self.task_handler.__on_batch_item_descheduled__(self)
+
+        def is_scheduled(self) -> bool:
+            return not self.is_descheduled
+
+        def is_done(self) -> bool:
+            return self.is_taken
+
+        def time_left(self) -> float:
+            return -1 if self.is_descheduled or self.is_taken else 0
+
+        def time_left_relative(self) -> float:
+            return 0
+
+        def get_delay(self) -> float:
+            return 0
@@ -0,0 +1,102 @@
+from threading import Event
+
+from backpressure import OverflowPolicy
+from distibuted_system import DistributedSystemBuilder
+from distributed_objects.channel import SimpleDelayChannel, FifoDelayChannel
+from distributed_objects.process import SimpleEchoProcess
+
+capacity = 10
+messages_count = 20000
+
+
+class BlockedProcess(SimpleEchoProcess):
+    """
+    stays in its first message until released, so everything else waits in its mailbox
+    """
+
+    def __init__(self, process_id):
+        super().__init__(process_id)
+        self.release_event = Event()
+        self.is_blocked = Event()
+
+    def _on_receive_message_(self, message):
+        self.is_blocked.set()
+        self.release_event.wait(10)
+
+
+def build_system(channel, set_capacity):
+    builder = DistributedSystemBuilder()
+    builder.add_process(BlockedProcess(0))
+    builder.add_process(BlockedProcess(1))
+    builder.add_channel(channel, 0, 1)
+    set_capacity(builder)
+    distributed_system = builder.build()
+    distributed_system.start()
+    return distributed_system
+
+
+def get_queued_tasks_count(task_handler):
+    # read under the lock, handler's thread may be moving tasks between the queues
+    with task_handler.task_lock:
+        return task_handler.get_queued_tasks_count()
+
+
+def get_kept_tasks_count(task_handler):
+    return (len(task_handler.pending_instant_tasks) + len(task_handler.scheduled_instant_task) +
+            len(task_handler.pending_delayed_tasks) + len(task_handler.scheduled_delayed_tasks))
+
+
+def test_drop_oldest_mailbox_keeps_capacity_tasks():
+    distributed_system = build_system(
+        SimpleDelayChannel([1000, 1000]),
+        lambda builder: builder.set_mailbox_capacity(capacity, OverflowPolicy.drop_oldest, 1)
+    )
+    receiver = distributed_system.communication_helper.get_process_with_id(1)
+    try:
+        receiver.receive_message_from(0, -1)
+        assert receiver.is_blocked.wait(5)
+        task_handler = receiver.task_handler
+        for i in range(messages_count):
+            receiver.receive_message_from(0, i)
+            assert get_queued_tasks_count(task_handler) <= capacity
+        # descheduled tasks are removed once they take more than a half of the queue
+        assert get_kept_tasks_count(task_handler) <= 2 * capacity + 1
+        assert receiver.mailbox.dropped_count == messages_count - capacity
+    finally:
+        receiver.release_event.set()
+        distributed_system.stop(True)
+
+
+def test_drop_oldest_channel_keeps_capacity_tasks():
+    channel = SimpleDelayChannel([1000, 1000])
+    distributed_system = build_system(
+        channel,
+        lambda builder: builder.set_channel_capacity(capacity, OverflowPolicy.drop_oldest, 0, 1)
+    )
+    sender = distributed_system.communication_helper.get_process_with_id(0)
+    try:
+        task_handler = channel.task_handler
+        for i in range(messages_count):
+            sender.send_message(1, i)
+            assert get_queued_tasks_count(task_handler) <= capacity
+        assert get_kept_tasks_count(task_handler) <= 2 * capacity + 1
+    finally:
+        distributed_system.stop(True)
+
+
+def test_drop_oldest_fifo_channel_keeps_capacity_messages():
+    channel = FifoDelayChannel([1000, 1000])
+    distributed_system = build_system(
+        channel,
+        lambda builder: builder.set_channel_capacity(capacity, OverflowPolicy.drop_oldest, 0, 1)
+    )
+    sender = distributed_system.communication_helper.get_process_with_id(0)
+    try:
+        for i in range(messages_count):
+            sender.send_message(1, i)
+        assert len(channel.get_current_state_information()) == capacity
+        assert len(channel.queue) <= 2 * capacity + 1
+        # only the head of the queue has a timer
+        assert get_queued_tasks_count(channel.task_handler) == 1
+    finally:
+        distributed_system.stop(True)
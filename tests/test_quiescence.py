@@ -0,0 +1,95 @@
+import time
+
+import pytest
+
+from distibuted_system import DistributedSystemBuilder
+from distributed_objects.channel import SimpleDelayChannel
+from distributed_objects.process import AbstractProcess
+from taskexecutor import ThreadPerHandlerExecutor, WorkerPoolExecutor, VirtualTimeExecutor, AsyncioExecutor
+
+processes_count = 4
+hops_count = 200
+
+
+class HopProcess(AbstractProcess):
+    """
+    passes one message around the ring hops_count times
+    """
+
+    def __init__(self, process_id):
+        super().__init__()
+        self.process_id = process_id
+        self.received_count = 0
+
+    def get_id(self):
+        return self.process_id
+
+    def is_init_process(self):
+        return self.process_id == 0
+
+    def _on_receive_message_(self, message):
+        if message == AbstractProcess.kick_off_message:
+            message = 0
+        self.received_count += 1
+        if message < hops_count:
+            self.send_message((self.process_id + 1) % processes_count, message + 1)
+
+
+class SlowDecidingProcess(HopProcess):
+    """
+    is in terminal state while it's still performing its action
+    """
+
+    def __init__(self, process_id):
+        super().__init__(process_id)
+        self.is_decided = False
+
+    def is_in_terminal_state(self) -> bool:
+        return self.is_decided
+
+    def _on_receive_message_(self, message):
+        self.is_decided = True
+        time.sleep(0.2)
+        self.received_count += 1
+
+
+def build_system(executor, process_type=HopProcess):
+    builder = DistributedSystemBuilder().set_task_executor(executor)
+    processes = [process_type(process_id) for process_id in range(processes_count)]
+    for process in processes:
+        builder.add_process(process)
+    for process_id in range(processes_count):
+        builder.add_channel(SimpleDelayChannel([0.0005, 0.001]), process_id, (process_id + 1) % processes_count)
+    return builder.build(), processes
+
+
+@pytest.mark.parametrize("create_executor", [ThreadPerHandlerExecutor, WorkerPoolExecutor, VirtualTimeExecutor,
+                                             AsyncioExecutor])
+def test_run_until_quiescent_returns_when_messages_are_handled(create_executor):
+    executor = create_executor()
+    distributed_system, processes = build_system(executor)
+    try:
+        assert distributed_system.run_until_quiescent(10)
+        assert sum(process.received_count for process in processes) == hops_count + 1
+        assert all(task_handler.on_drained is None for task_handler in distributed_system.__get_all_task_handlers__())
+    finally:
+        distributed_system.stop(True)
+        if hasattr(executor, "shutdown"):
+            executor.shutdown()
+
+
+def test_run_until_quiescent_waits_for_process_in_terminal_state():
+    distributed_system, processes = build_system(ThreadPerHandlerExecutor(), SlowDecidingProcess)
+    try:
+        assert distributed_system.run_until_quiescent(5)
+        assert processes[0].received_count == 1
+    finally:
+        distributed_system.stop(True)
+
+
+def test_run_until_quiescent_times_out():
+    distributed_system, _ = build_system(ThreadPerHandlerExecutor())
+    try:
+        assert not distributed_system.run_until_quiescent(0.01)
+    finally:
+        distributed_system.stop(True)
@@ -0,0 +1,76 @@
+from distibuted_system import DistributedSystemBuilder
+from distributed_objects.channel import SimpleDelayChannel
+from distributed_objects.faulty_channel import FaultyChannel
+from distributed_objects.process import AbstractProcess
+from execution_trace import read_trace
+from replay import ReplaySchedule
+from taskexecutor import VirtualTimeExecutor, WorkerPoolExecutor
+
+processes_count = 4
+# every process forwards this many messages, so duplicates don't make the run endless
+forwarded_messages_count = 40
+
+
+class ForwardingProcess(AbstractProcess):
+    def __init__(self, process_id):
+        super().__init__()
+        self.process_id = process_id
+        self.received_messages = []
+
+    def get_id(self):
+        return self.process_id
+
+    def is_init_process(self):
+        return self.process_id == 0
+
+    def get_current_state_information(self):
+        return tuple(self.received_messages)
+
+    def _on_receive_message_(self, message):
+        self.received_messages.append(message)
+        if len(self.received_messages) <= forwarded_messages_count:
+            receiver_id = (self.process_id + 1 + len(self.received_messages) % 2) % processes_count
+            self.send_message(receiver_id, (self.process_id, len(self.received_messages)))
+
+
+def build_system(executor):
+    builder = DistributedSystemBuilder().set_task_executor(executor).set_random_seed(11)
+    for sender_id in range(processes_count):
+        builder.add_process(ForwardingProcess(sender_id))
+        for receiver_id in range(processes_count):
+            if sender_id != receiver_id:
+                builder.add_channel(
+                    FaultyChannel(SimpleDelayChannel([0.001, 0.003]), duplicate_probability=0.3),
+                    sender_id,
+                    receiver_id
+                )
+    return builder.build()
+
+
+def get_states(distributed_system):
+    processes = distributed_system.communication_helper.get_all_processes()
+    return [process.get_current_state_information() for process in processes]
+
+
+def test_replay_delivers_duplicated_messages(tmp_path):
+    trace_path = str(tmp_path / "run.trace")
+    executor = WorkerPoolExecutor(2)
+    distributed_system = build_system(executor)
+    distributed_system.start_trace(trace_path)
+    distributed_system.start()
+    assert distributed_system.run_until_quiescent(10)
+    distributed_system.stop_trace()
+    recorded_states = get_states(distributed_system)
+    distributed_system.stop()
+    executor.shutdown()
+
+    replay_schedule = ReplaySchedule.from_trace(read_trace(trace_path))
+    deliveries = replay_schedule.deliveries
+    # the same message number is delivered more than once
+    assert len(set(deliveries)) < len(deliveries)
+
+    replayed_system = build_system(VirtualTimeExecutor())
+    replayed_system.enable_replay(replay_schedule)
+    replayed_system.start()
+    assert replayed_system.run_replay() == len(deliveries)
+    assert get_states(replayed_system) == recorded_states
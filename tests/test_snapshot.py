@@ -0,0 +1,79 @@
+import random
+
+import pytest
+
+from distibuted_system import DistributedSystemBuilder
+from distributed_objects.channel import SimpleDelayChannel, FifoDelayChannel
+from distributed_objects.faulty_channel import FaultyChannel
+from distributed_objects.process import AbstractProcess
+
+processes_count = 4
+initial_tokens = 10
+
+
+class TokenProcess(AbstractProcess):
+    """
+    passes random amounts of its tokens around, all the processes together always have the same amount
+    """
+
+    def __init__(self, process_id):
+        super().__init__()
+        self.process_id = process_id
+        self.tokens = initial_tokens
+        self.random = random.Random(process_id)
+
+    def get_id(self):
+        return self.process_id
+
+    def is_init_process(self):
+        return True
+
+    def get_current_state_information(self):
+        return self.tokens
+
+    def _on_receive_message_(self, message):
+        if message != AbstractProcess.kick_off_message:
+            self.tokens += message
+        sent_tokens = self.random.randint(0, self.tokens)
+        if sent_tokens:
+            self.tokens -= sent_tokens
+            receivers_ids = self.channel_communication_provider.get_available_process_id()
+            self.send_message(self.random.choice(receivers_ids), sent_tokens)
+
+
+def build_system(create_channel):
+    builder = DistributedSystemBuilder()
+    for sender_id in range(processes_count):
+        builder.add_process(TokenProcess(sender_id))
+        for receiver_id in range(processes_count):
+            if sender_id != receiver_id:
+                builder.add_channel(create_channel(), sender_id, receiver_id)
+    distributed_system = builder.build()
+    distributed_system.start()
+    return distributed_system
+
+
+def test_snapshot_over_fifo_channels_keeps_all_tokens():
+    distributed_system = build_system(lambda: FifoDelayChannel([0.0, 0.002]))
+    try:
+        for _ in range(5):
+            snapshot = distributed_system.take_snapshot()
+            assert snapshot.wait(5)
+            processes_states, channels_states = snapshot.get_result()
+            in_flight_tokens = sum(sum(channel_messages) for channel_messages in channels_states)
+            assert sum(processes_states) + in_flight_tokens == processes_count * initial_tokens
+    finally:
+        distributed_system.stop(True)
+
+
+@pytest.mark.parametrize("create_channel", [
+    lambda: SimpleDelayChannel([0.0, 0.002]),
+    lambda: FaultyChannel(FifoDelayChannel([0.0, 0.002]), reorder_probability=0.5, reorder_window=0.002)
+])
+def test_snapshot_over_reordering_channels_is_refused(create_channel):
+    distributed_system = build_system(create_channel)
+    try:
+        with pytest.raises(RuntimeError):
+            distributed_system.take_snapshot()
+    finally:
+        distributed_system.stop(True)